@@ -0,0 +1,127 @@
+import argparse
+import statistics
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from ingest import create_month_partitions, create_table, db_uri
+
+"""
+This script benchmarks the month filter used by the batch scripts and the Mage loaders.
+It builds a multi-year synthetic customer feature table in three layouts
+    flat:        plain table without index (the original layout)
+    indexed:     plain table with an index on date
+    partitioned: month range-partitioned table with an index on date
+and measures the server-side execution time of selecting one month with
+    extract: WHERE EXTRACT(YEAR FROM date) = ... AND EXTRACT(MONTH FROM date) = ...
+    range:   WHERE date >= '<month start>' AND date < '<next month start>'
+Usage:
+    python benchmark_month_filter.py [--years 3] [--rows-per-month 100000] [--repeats 5]
+"""
+
+FEATURE_COLUMNS = [f"x{i}" for i in range(1, 11)]
+LAYOUTS = ["flat", "indexed", "partitioned"]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark month filters on a synthetic table")
+    parser.add_argument("--years", type=int, default=3, help="Years of monthly data to generate")
+    parser.add_argument("--rows-per-month", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per query")
+    parser.add_argument("--start-year", type=int, default=2023)
+    parser.add_argument("--db-uri", default=db_uri, help="SQLAlchemy database URI")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark tables")
+    return parser.parse_args()
+
+
+def build_table(engine, layout, start, months, rows_per_month):
+    """Create and fill bench_<layout> with rows_per_month rows for each month."""
+    table_name = f"bench_{layout}"
+    with engine.connect() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {table_name} CASCADE"))
+        conn.commit()
+
+    # Use the ingest schema logic on a one-row template of the customer features
+    template = pd.DataFrame([[0.0] * len(FEATURE_COLUMNS)], columns=FEATURE_COLUMNS)
+    template.insert(0, "date", pd.Timestamp(start, tz="UTC"))
+    template["persona"] = 0
+    create_table(engine, template, table_name, partition_by_month=layout == "partitioned")
+
+    if layout == "flat":
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP INDEX IF EXISTS {table_name}_date_idx"))
+            conn.commit()
+    if layout == "partitioned":
+        month_range = pd.date_range(start, periods=months, freq="MS")
+        create_month_partitions(engine, table_name, [m.date() for m in month_range])
+
+    features = ", ".join("random() * 20 - 10" for _ in FEATURE_COLUMNS)
+    with engine.connect() as conn:
+        conn.execute(
+            text(
+                f"""
+                INSERT INTO {table_name} (date, {', '.join(FEATURE_COLUMNS)}, persona)
+                SELECT m + (i % 28) * interval '1 day', {features}, NULL
+                FROM generate_series(CAST(:start AS timestamptz),
+                                     CAST(:start AS timestamptz) + (:months - 1) * interval '1 month',
+                                     interval '1 month') AS m,
+                     generate_series(1, :rows) AS i
+                """
+            ),
+            {"start": start, "months": months, "rows": rows_per_month},
+        )
+        conn.execute(text(f"ANALYZE {table_name}"))
+        conn.commit()
+    return table_name
+
+
+def month_filter(kind, year, month):
+    """Return the WHERE clause for one month in the given filter style."""
+    if kind == "extract":
+        return f"EXTRACT(YEAR FROM date) = {year} AND EXTRACT(MONTH FROM date) = {month}"
+    start = pd.Timestamp(year=year, month=month, day=1)
+    end = start + pd.offsets.MonthBegin(1)
+    return f"date >= '{start.date()}' AND date < '{end.date()}'"
+
+
+def time_query(engine, query, repeats):
+    """Return the median server-side execution time (ms) of query and its top plan node."""
+    timings = []
+    with engine.connect() as conn:
+        # Warm-up run so every variant is measured with a hot buffer cache
+        conn.execute(text(query)).fetchall()
+        for _ in range(repeats):
+            plan = conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}")).scalar()
+            timings.append(plan[0]["Execution Time"])
+    return statistics.median(timings), plan[0]["Plan"]["Node Type"]
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    engine = create_engine(args.db_uri)
+    months = args.years * 12
+    start = f"{args.start_year}-01-01"
+
+    print(f"Building {len(LAYOUTS)} tables with {months * args.rows_per_month} rows each ...")
+    tables = {layout: build_table(engine, layout, start, months, args.rows_per_month) for layout in LAYOUTS}
+
+    # Query a month from the middle of the range
+    year, month = args.start_year + args.years // 2, 6
+    results = []
+    for layout, table_name in tables.items():
+        for kind in ["extract", "range"]:
+            query = f"SELECT * FROM {table_name} WHERE {month_filter(kind, year, month)}"
+            median_ms, node = time_query(engine, query, args.repeats)
+            results.append({"layout": layout, "filter": kind, "median_ms": round(median_ms, 2), "plan": node})
+
+    results = pd.DataFrame(results)
+    baseline = results.query("layout == 'flat' and filter == 'extract'")["median_ms"].iloc[0]
+    results["speedup"] = (baseline / results["median_ms"]).round(1)
+    print(f"\nSelecting {month}/{year} out of {months} months ({args.repeats} runs, median):")
+    print(results.to_string(index=False))
+
+    if not args.keep:
+        with engine.connect() as conn:
+            for table_name in tables.values():
+                conn.execute(text(f"DROP TABLE IF EXISTS {table_name} CASCADE"))
+            conn.commit()
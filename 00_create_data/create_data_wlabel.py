@@ -1,29 +1,34 @@
-import sys
 import pandas as pd
 from sklearn.datasets import make_blobs
 
+from data_generation import (
+    FEATURE_COLUMNS,
+    generate_shards,
+    parse_arguments,
+    save_partition,
+)
+
 """
 This script generates synthetic data using the make_blobs function from sklearn.
 It creates a DataFrame with 10 features and saves it to a CSV file.
 Usage:
-    python create_data.py <n> <C> <cluster_std> <RSEED> [<filename>]
+    python create_data_wlabel.py <n> <cluster_std> <RSEED> <month> [<filename>]
+                     [--chunk-size <rows> [--workers <n>]]
+                     [--format csv|parquet|arrow] [--dtype float64|float32]
 where:
     n: Number of samples
     cluster_std: Standard deviation of clusters
     RSEED: Random seed for reproducibility
+    month: Month for the date column
     filename: Output filename
+    --chunk-size: generate the rows in seeded chunks across a process pool and write
+                  one shard per chunk to ../data/<filename stem>/month=2025-MM/
+    --format: parquet / arrow write the month partition ../data/<filename stem>/month=2025-MM/
+              as columnar files instead of a single CSV
+    --dtype: float type of the feature columns
     not used: C: Number of clusters, centroids are initialized in the code
     """
 
-n = int(sys.argv[1])  # Number of samples (500 in the original code)
-cluster_std = float(
-    sys.argv[2]
-)  # Standard deviation of clusters (2 in the original code)
-RSEED = int(sys.argv[3])  # Random seed for reproducibility
-month = int(sys.argv[4])  # Month for the date column (default is June)
-filename = sys.argv[5] if len(sys.argv) > 0 else "data.csv"  # Output filename
-# C = int(sys.argv[5])  # Number of clusters (3 in the original code)
-
 # initialization of centroids
 # these centroids are used to generate the synthetic data.
 centroids = [
@@ -92,7 +97,7 @@ def create_data(n, cluster_std, RSEED, month, C):
     return df
 
 
-def save_data(df, filename=filename):
+def save_data(df, filename):
     """Save the DataFrame to a CSV file.
     Args:
         df (pd.DataFrame): DataFrame to save.
@@ -106,7 +111,31 @@ def save_data(df, filename=filename):
 
 if __name__ == "__main__":
     """Main function to create and save the data."""
-    df = create_data(n, cluster_std, RSEED, month, C=centroids)
-    filename = save_data(df)
+    args = parse_arguments("Generate synthetic customer feature data")
+
+    if args.chunk_size:
+        # Chunked mode: seeded chunks across a process pool, one shard per chunk
+        generate_shards(
+            args.n,
+            args.cluster_std,
+            args.RSEED,
+            args.month,
+            centroids,
+            args.filename,
+            args.chunk_size,
+            args.workers,
+            args.format,
+            with_label=True,
+            dtype=args.dtype,
+        )
+    else:
+        df = create_data(
+            args.n, args.cluster_std, args.RSEED, args.month, C=centroids
+        )
+        df = df.astype({col: args.dtype for col in FEATURE_COLUMNS})
+        if args.format == "csv":
+            filename = save_data(df, args.filename)
+        else:
+            save_partition(df, args.filename, args.month, args.format)
 
-    print(f"Dataframe shape: {df.shape}")
+        print(f"Dataframe shape: {df.shape}")
@@ -0,0 +1,198 @@
+import argparse
+import glob
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.datasets import make_blobs
+
+"""
+Shared helpers for create_data.py and create_data_wlabel.py.
+Besides the command line parsing this module holds the chunked generator mode:
+rows are generated in chunks of a fixed size across a process pool, and every
+chunk is written as its own shard file. Each chunk draws from its own seed,
+derived from RSEED and the chunk index only, so the output is reproducible
+regardless of the number of workers.
+Shards are laid out month-partitioned as
+    ../data/<filename stem>/month=2025-MM/part-NNNNN.<csv|parquet|arrow>
+Parquet and Arrow IPC store the features as binary float32/float64 columns, so
+readers skip the float text parsing of CSV. Arrow IPC files are written
+uncompressed, which lets readers memory-map them without copying.
+"""
+
+FEATURE_COLUMNS = ["x1", "x2", "x3", "x4", "x5", "x6", "x7", "x8", "x9", "x10"]
+DATA_DIR = "../data"
+FORMATS = ["csv", "parquet", "arrow"]
+DTYPES = ["float64", "float32"]
+
+
+def parse_arguments(description):
+    """Parse the command line arguments shared by the data generation scripts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("n", type=int, help="Number of samples")
+    parser.add_argument("cluster_std", type=float, help="Standard deviation of clusters")
+    parser.add_argument("RSEED", type=int, help="Random seed for reproducibility")
+    parser.add_argument("month", type=int, choices=range(1, 13), help="Month for the date column")
+    parser.add_argument("filename", nargs="?", default="data.csv", help="Output filename")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="Generate rows in seeded chunks of this size, one shard file per chunk",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Processes generating chunks in parallel (default: all cores)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="csv",
+        help="Output format, parquet and arrow are written month-partitioned (default: csv)",
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=DTYPES,
+        default="float64",
+        help="Float type of the feature columns (default: float64)",
+    )
+    return parser.parse_args()
+
+
+def build_frame(X, y, month, with_label, dtype="float64"):
+    """Assemble the customer feature DataFrame from generated blobs.
+    Args:
+        X (np.ndarray): Feature matrix.
+        y (np.ndarray): Blob labels.
+        month (int): Month for the date column.
+        with_label (bool): Fill 'persona' with the blob labels instead of NaN.
+        dtype (str): Float type of the feature columns.
+    Returns:
+        pd.DataFrame: DataFrame with date, x1..x10 and persona."""
+    df = pd.DataFrame(X.astype(dtype, copy=False), columns=FEATURE_COLUMNS)
+    df.insert(0, "date", pd.to_datetime(f"2025-{month:02d}-01"))
+    df["persona"] = y if with_label else np.nan
+    return df
+
+
+def write_frame(df, path, fmt):
+    """Write a DataFrame to path as CSV, Parquet or (uncompressed) Arrow IPC."""
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "arrow":
+        # pyarrow is only needed for Arrow output (to_parquet imports it itself)
+        import pyarrow.feather as feather
+
+        # Uncompressed, so the columns can be memory-mapped straight from the file
+        feather.write_feather(df, path, compression="uncompressed")
+    else:
+        df.to_csv(path, index=False)
+
+
+def month_dir(filename, month):
+    """Return the month partition directory ../data/<filename stem>/month=2025-MM."""
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(DATA_DIR, stem, f"month=2025-{month:02d}")
+
+
+def save_partition(df, filename, month, fmt):
+    """Write a DataFrame as the single shard of its month partition.
+    Returns:
+        str: Path of the written file."""
+    out_dir = month_dir(filename, month)
+    os.makedirs(out_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(out_dir, "part-*")):
+        os.remove(stale)
+    path = os.path.join(out_dir, f"part-00000.{fmt}")
+    write_frame(df, path, fmt)
+    print(f"Data saved to {path}")
+    return path
+
+
+def chunk_seeds(RSEED, n_chunks):
+    """Derive one independent seed per chunk from RSEED.
+    The seed of a chunk only depends on RSEED and the chunk index."""
+    return [
+        int(seq.generate_state(1)[0])
+        for seq in np.random.SeedSequence(RSEED).spawn(n_chunks)
+    ]
+
+
+def generate_shard(task):
+    """Generate one chunk and write it as a shard. Runs in a worker process.
+    Returns:
+        tuple: (path, rows) of the written shard."""
+    rows, seed, cluster_std, month, centers, with_label, path, fmt, dtype = task
+    X, y = make_blobs(
+        n_samples=rows,
+        n_features=10,
+        centers=centers,
+        cluster_std=cluster_std,
+        center_box=(-10.0, 10.0),
+        random_state=seed,
+    )
+    write_frame(build_frame(X, y, month, with_label, dtype), path, fmt)
+    return path, rows
+
+
+def generate_shards(
+    n,
+    cluster_std,
+    RSEED,
+    month,
+    C,
+    filename,
+    chunk_size,
+    workers,
+    fmt,
+    with_label,
+    dtype="float64",
+):
+    """Generate n rows in chunks across a process pool and write them as shards.
+    The shards are written to ../data/<filename stem>/month=2025-MM/part-<i>.<fmt>,
+    which ingest.py accepts as a directory source.
+    Args:
+        n (int): Number of samples.
+        cluster_std (float): Standard deviation of clusters.
+        RSEED (int): Random seed for reproducibility.
+        month (int): Month for the date column.
+        C (list): Cluster centroids.
+        filename (str): Output filename, its stem names the shard directory.
+        chunk_size (int): Rows per chunk / shard.
+        workers (int): Number of worker processes.
+        fmt (str): 'csv', 'parquet' or 'arrow'.
+        with_label (bool): Fill 'persona' with the blob labels.
+        dtype (str): Float type of the feature columns.
+    Returns:
+        str: The shard directory."""
+    out_dir = month_dir(filename, month)
+    os.makedirs(out_dir, exist_ok=True)
+    # Remove shards of a previous run, which might have had more chunks
+    for stale in glob.glob(os.path.join(out_dir, "part-*")):
+        os.remove(stale)
+
+    n_chunks = math.ceil(n / chunk_size)
+    seeds = chunk_seeds(RSEED, n_chunks)
+    tasks = [
+        (
+            min(chunk_size, n - i * chunk_size),
+            seeds[i],
+            cluster_std,
+            month,
+            C,
+            with_label,
+            os.path.join(out_dir, f"part-{i:05d}.{fmt}"),
+            fmt,
+            dtype,
+        )
+        for i in range(n_chunks)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, rows in pool.map(generate_shard, tasks):
+            print(f"Shard {path} written ({rows} rows)")
+    print(f"{n} rows written to {n_chunks} shards in {out_dir}")
+    return out_dir
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark the k-sweep of the training code: one fit per k against the former fit + refit.
+
+The former sweep fitted every k with model.fit(X) and then once more with
+silhouette_score(X, model.fit_predict(X)). The shared sweep (kmeans_sweep.evaluate_k)
+fits once and scores model.labels_. For every dataset size the script times both over
+the whole k range, without MLflow logging, and counts the k values whose refit labels
+differ from the logged fit (adjusted Rand index below 1), i.e. where the former
+silhouette described a different clustering than the logged model.
+
+With --workers N the parallel sweep (kmeans_sweep.evaluate_parallel, N processes) is
+timed as well, next to the slowest single k of the serial sweep, the lower bound of
+the parallel sweep time.
+
+Usage:
+    python benchmark_kmeans_sweep.py [--sizes 2000 10000 30000] [--k-min 2 --k-max 10] [--n-init 10]
+                                     [--workers 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.datasets import make_blobs
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+
+# The k-sweep is shared with the Mage pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_pipeline", "mage_pipeline"))
+from dtc_persona_analysis.utils.kmeans_sweep import evaluate_k, evaluate_parallel
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the KMeans k-sweep")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 10000, 30000], help='Rows of the datasets')
+    parser.add_argument('--k-min', type=int, default=2)
+    parser.add_argument('--k-max', type=int, default=10)
+    parser.add_argument('--n-init', type=int, default=10, help='KMeans initializations per fit')
+    parser.add_argument('--workers', type=int, default=0, help='Also time the parallel sweep with this many processes')
+    return parser.parse_args()
+
+
+def make_data(rows, seed=0):
+    """Synthetic customer features: 10 columns x1..x10 around 5 personas."""
+    X, _ = make_blobs(n_samples=rows, n_features=10, centers=5, cluster_std=2.5, random_state=seed)
+    return pd.DataFrame(X, columns=[f"x{i}" for i in range(1, 11)])
+
+
+def former_evaluate_k(X, n_clusters, n_init):
+    """The former sweep step: fit, then refit for the silhouette. Returns (logged labels, scored labels)."""
+    model = KMeans(n_clusters=n_clusters, n_init=n_init)
+    model.fit(X)
+    # Autologged at this point, fit_predict then refits the model in place
+    logged_labels = model.labels_.copy()
+    scored_labels = model.fit_predict(X)
+    silhouette_score(X, scored_labels)
+    return logged_labels, scored_labels
+
+
+def main():
+    args = parse_arguments()
+    k_values = range(args.k_min, args.k_max + 1)
+    print(f"k = {args.k_min}..{args.k_max}, n_init={args.n_init}, seconds per sweep:")
+    header = f"{'rows':>7} {'former':>9} {'fit once':>9} {'saving':>8} {'fit share':>10} {'refit differs':>14}"
+    if args.workers:
+        header += f" {f'{args.workers} workers':>10} {'slowest k':>10}"
+    print(header)
+    for rows in args.sizes:
+        X = make_data(rows)
+
+        start = time.perf_counter()
+        labels = [former_evaluate_k(X, k, args.n_init) for k in k_values]
+        former = time.perf_counter() - start
+        differs = sum(adjusted_rand_score(logged, scored) < 1 for logged, scored in labels)
+
+        start = time.perf_counter()
+        metrics = [evaluate_k(X, k, n_init=args.n_init)[1] for k in k_values]
+        once = time.perf_counter() - start
+        fit_seconds = sum(m["fit_seconds"] for m in metrics)
+
+        line = (f"{rows:>7} {former:>8.2f}s {once:>8.2f}s {1 - once / former:>8.1%} "
+                f"{fit_seconds / once:>10.1%} {differs:>8}/{len(k_values)}")
+        if args.workers:
+            start = time.perf_counter()
+            for _ in evaluate_parallel(X, k_values, args.workers, n_init=args.n_init):
+                pass
+            parallel = time.perf_counter() - start
+            slowest = max(m["fit_seconds"] + m["silhouette_seconds"] for m in metrics)
+            line += f" {parallel:>9.2f}s {slowest:>9.2f}s"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
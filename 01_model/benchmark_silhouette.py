@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark the silhouette estimators of the k-sweep (silhouette.py) against the exact score.
+
+For every dataset size, KMeans is fitted once per k and the fitted clustering is scored
+with every estimator. Per estimator the script reports the mean time per k, the mean
+absolute error against the exact silhouette, for the sampled estimator the share of
+the (k, seed) pairs whose confidence interval contains the exact score, and the k that
+the selection metric silhouette_inertia_ratio picks with it (exact: the k it should
+pick). The exact score is skipped above --exact-max-rows.
+
+Usage:
+    python benchmark_silhouette.py [--sizes 5000 20000] [--sample-sizes 1000 2000 5000] [--seeds 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from sklearn.cluster import KMeans
+
+from benchmark_kmeans_sweep import make_data
+
+# The silhouette estimators are shared with the Mage pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_pipeline", "mage_pipeline"))
+from dtc_persona_analysis.utils.silhouette import estimate_silhouette
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the silhouette estimators")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 20000], help='Rows of the datasets')
+    parser.add_argument('--k-min', type=int, default=2)
+    parser.add_argument('--k-max', type=int, default=10)
+    parser.add_argument('--sample-sizes', type=int, nargs='+', default=[1000, 2000, 5000],
+                        help='Sample sizes of the sampled estimator')
+    parser.add_argument('--seeds', type=int, default=5, help='Seeds per sample size')
+    parser.add_argument('--exact-max-rows', type=int, default=50_000, help='Largest size scored exactly')
+    return parser.parse_args()
+
+
+def timed(X, model, estimator, **kwargs):
+    start = time.perf_counter()
+    scores = estimate_silhouette(X, model, estimator, **kwargs)
+    return scores, time.perf_counter() - start
+
+
+def selected_k(models, silhouettes):
+    """The k with the best silhouette_inertia_ratio."""
+    return max(models, key=lambda k: silhouettes[k] * 1000 / models[k].inertia_)
+
+
+def main():
+    args = parse_arguments()
+    k_values = range(args.k_min, args.k_max + 1)
+    print(f"k = {args.k_min}..{args.k_max}, {args.seeds} seeds per sample size")
+    print(f"{'rows':>7} {'estimator':>16} {'s per k':>9} {'abs error':>10} {'CI coverage':>12} {'selected k':>11}")
+    for rows in args.sizes:
+        X = make_data(rows)
+        models = {k: KMeans(n_clusters=k, n_init=3, random_state=0).fit(X) for k in k_values}
+
+        exact = None
+        if rows <= args.exact_max_rows:
+            results = {k: timed(X, model, "exact") for k, model in models.items()}
+            exact = {k: scores["silhouette"] for k, (scores, _) in results.items()}
+            seconds = statistics.fmean(s for _, s in results.values())
+            print(f"{rows:>7} {'exact':>16} {seconds:>9.3f} {'':>10} {'':>12} {selected_k(models, exact):>11}")
+
+        for sample_size in args.sample_sizes:
+            errors, covered, times, first_seed = [], [], [], {}
+            for seed in range(args.seeds):
+                for k, model in models.items():
+                    scores, seconds = timed(X, model, "sampled", sample_size=sample_size, seed=seed)
+                    times.append(seconds)
+                    if seed == 0:
+                        first_seed[k] = scores["silhouette"]
+                    if exact is not None:
+                        errors.append(abs(scores["silhouette"] - exact[k]))
+                        # The interval closes when the sample is all rows, allow for rounding
+                        covered.append(scores["silhouette_ci_low"] - 1e-9 <= exact[k] <= scores["silhouette_ci_high"] + 1e-9)
+            error = f"{statistics.fmean(errors):>10.4f}" if errors else f"{'':>10}"
+            coverage = f"{statistics.fmean(covered):>12.0%}" if covered else f"{'':>12}"
+            print(f"{rows:>7} {f'sampled {sample_size}':>16} {statistics.fmean(times):>9.3f} {error} {coverage} "
+                  f"{selected_k(models, first_seed):>11}")
+
+        results = {k: timed(X, model, "simplified") for k, model in models.items()}
+        simplified = {k: scores["silhouette"] for k, (scores, _) in results.items()}
+        seconds = statistics.fmean(s for _, s in results.values())
+        error = f"{statistics.fmean(abs(simplified[k] - exact[k]) for k in k_values):>10.4f}" if exact else f"{'':>10}"
+        print(f"{rows:>7} {'simplified':>16} {seconds:>9.3f} {error} {'':>12} {selected_k(models, simplified):>11}")
+
+
+if __name__ == "__main__":
+    main()
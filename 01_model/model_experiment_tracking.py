@@ -1,11 +1,18 @@
+import argparse
+import glob
+import os
+import sys
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import mlflow
 import mlflow.pyfunc
 
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
-
-from tqdm import tqdm  # Progress bar for loops
+# The k-sweep is shared with the Mage pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_pipeline", "mage_pipeline"))
+from dtc_persona_analysis.utils.kmeans_sweep import run_sweep
+from dtc_persona_analysis.utils.silhouette import ESTIMATORS, SAMPLE_SIZE
 
 import logging
 
@@ -28,64 +35,72 @@ mlflow.sklearn.autolog()
 
 
 # Load the dataset
+def read_file(path):
+    """Read a single CSV, Parquet or Arrow IPC file into a DataFrame.
+    Arrow IPC files are memory-mapped: the float columns are handed to pandas
+    without copying (one block per column), so loading costs no float parsing
+    and no extra memory. Parquet is decoded from a memory-mapped file.
+    Floats keep the stored dtype, KMeans fits float32 data without upcasting."""
+    if path.endswith(".arrow"):
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True)
+    if path.endswith(".parquet"):
+        return pq.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+    return pd.read_csv(path)
+
+
 def read_data(path):
-    X = pd.read_csv(path)
+    """Read the dataset from a file or from a (month-partitioned) directory.
+    Args:
+        path (str): CSV/Parquet/Arrow IPC file, or a directory such as
+            ../data/<name>/ written by create_data.py, searched recursively.
+    Returns:
+        pd.DataFrame: The concatenated data."""
+    if not os.path.isdir(path):
+        return read_file(path)
+    files = sorted(
+        f
+        for f in glob.glob(os.path.join(path, "**", "*"), recursive=True)
+        if f.endswith((".csv", ".parquet", ".arrow"))
+    )
+    frames = [read_file(f) for f in files]
+    # A single file is returned as is, so a memory-mapped read stays zero-copy
+    X = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
     return X
 
 
 # Experiment tracking function
-def experiment_tracking(X, k_min, k_max):
+def experiment_tracking(X, k_min, k_max, workers=1, silhouette="exact", sample_size=SAMPLE_SIZE, seed=0):
     """Run the experiment tracking for KMeans clustering.
+    Every k is fitted once, one nested run per k (see kmeans_sweep.py).
     Args:
         X (pd.DataFrame): DataFrame containing the data to cluster.
+        workers (int): Processes fitting k values in parallel, 1 fits them in turn.
+        silhouette (str): Silhouette estimator, exact, sampled or simplified (see silhouette.py).
+        sample_size (int): Rows scored by the sampled estimator, drawn with seed.
     Returns:
         None"""
-    with mlflow.start_run() as parent_run:
-        # Iterate over the range of clusters
-        for clusters in tqdm(range(k_min, k_max + 1)):
-
-            # Start a new MLflow run for each cluster count
-            with mlflow.start_run(nested=True):  # run_name=f"kmeans_basic_k={C}"):
-
-                # Log the input data
-                mlflow.log_param("input_data_shape", X.shape)
-                mlflow.log_param("input_data_columns", list(X.columns))
-
-                # Instantiate your model
-                # MLflow will capture these parameters automatically
-                model = KMeans(n_clusters=clusters, n_init=10)  # , random_state=42)
-
-                # Fit the model
-                # MLflow intercepts this .fit() call to log metrics and artifacts
-                model.fit(X)
-
-                # inertia is the sum of squared distances to the nearest cluster center
-                # It is a measure of how tightly the clusters are packed
-                # Lower inertia means better clustering
-                mlflow.log_metric("inertia", model.inertia_)
-
-                # Log silhouette score, which measures how similar an object is to its own cluster compared to other clusters
-                # A higher silhouette score indicates better-defined clusters
-                silhouette = silhouette_score(X, model.fit_predict(X))
-                mlflow.log_metric("silhouette", silhouette)
-
-                # Log the ratio of silhouette score to inertia
-                # This ratio can help assess the quality of clustering relative to the compactness of clusters
-                score = silhouette * 1000 / model.inertia_
-                mlflow.log_metric("silhouette_inertia_ratio", score)
-
-                # Log the number of clusters
-                mlflow.log_param("n_clusters", clusters)
-
-                # Log the model itself
-                mlflow.set_tag("run_purpose", "script test")
+    _, results = run_sweep(X, k_min, k_max, run_purpose="script test", workers=workers,
+                           silhouette=silhouette, sample_size=sample_size, seed=seed)
+    for result in results:
+        print(f"k={result['n_clusters']}: fit {result['fit_seconds']:.2f}s, "
+              f"silhouette {result['silhouette_seconds']:.2f}s")
 
     return None
 
 
 # Main execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the KMeans k-sweep with MLflow tracking")
+    parser.add_argument('--workers', type=int, default=1, help='Processes fitting k values in parallel')
+    parser.add_argument('--silhouette', choices=ESTIMATORS, default="exact",
+                        help='Silhouette estimator, sampled or simplified for large months')
+    parser.add_argument('--sample-size', type=int, default=SAMPLE_SIZE, help='Rows scored by the sampled estimator')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the silhouette sample')
+    args = parser.parse_args()
     # Read the data
     X = read_data(path)
     # Run the experiment tracking
-    experiment_tracking(X, k_min=2, k_max=10)
+    experiment_tracking(X, k_min=2, k_max=10, workers=args.workers, silhouette=args.silhouette,
+                        sample_size=args.sample_size, seed=args.seed)
@@ -1,8 +1,14 @@
 import mlflow
 import mlflow.pyfunc
+import os
+import sys
 
 from model_register_best_run import find_best_run
 
+# The local model cache lives with the serving code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "03_deployment"))
+from model_cache import registry_model_path
+
 import logging
 
 logging.getLogger("mlflow").setLevel(
@@ -33,8 +39,9 @@ def load_model():
     print(f"Loading model from: {model_uri}")
 
     # loading the model using mlflow.sklearn.load_model to ensure compatibility with scikit-learn attributes
+    # repeated loads are served from the local model cache instead of the artifact store
     try:
-        loaded_model = mlflow.sklearn.load_model(model_uri)
+        loaded_model = mlflow.sklearn.load_model(registry_model_path(model_name, model_version))
         print("Model loaded successfully!")
         return loaded_model
     except Exception as e:
@@ -1,6 +1,13 @@
+import os
+import sys
+
 import mlflow
 import mlflow.pyfunc
 
+# The best-run search is shared with the Mage pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_pipeline", "mage_pipeline"))
+from dtc_persona_analysis.utils.kmeans_sweep import search_best_run
+
 import logging
 
 logging.getLogger("mlflow").setLevel(
@@ -17,22 +24,17 @@ mlflow.set_experiment(experiment_name)
 
 
 # Find the best run based on the silhouette_inertia_ratio metric and return the run ID.
-def find_best_run(experiment_name):
-    """Find the best run based on the silhouette_inertia_ratio metric.
+def find_best_run(experiment_name, silhouette="exact"):
+    """Find the best run based on the silhouette_inertia_ratio metric, among the runs
+    scored with the silhouette estimator silhouette.
     Returns:
         best run object
     """
     # Search for runs in the current experiment to find the best model, sorted by the main score "silhouette_inertia_ratio" descending
     experiment = mlflow.get_experiment_by_name(experiment_name)
-    runs = mlflow.search_runs(
-        experiment_ids=[experiment.experiment_id],
-        order_by=["metrics.silhouette_inertia_ratio DESC"],
-        max_results=1,
-    )
-
-    best_run = runs.iloc[0]
+    best_run = search_best_run([experiment.experiment_id], silhouette)
 
-    if not runs.empty:
+    if best_run is not None:
         print("Best run ID:", best_run.run_id)
         print(
             "Best silhouette_inertia_ratio:",
@@ -44,10 +46,10 @@ def find_best_run(experiment_name):
         raise ValueError("No runs found in the experiment.")
 
 
-def register_best_run(experiment_name, model_name):
+def register_best_run(experiment_name, model_name, silhouette="exact"):
 
     # Register the best run's model in the MLflow Model Registry.
-    best_run_id = find_best_run(experiment_name).run_id
+    best_run_id = find_best_run(experiment_name, silhouette).run_id
     print(f"Best run ID: {best_run_id}")
     # This will register the model with the best silhouette_inertia_ratio
     model_uri = f"runs:/{best_run_id}/model"
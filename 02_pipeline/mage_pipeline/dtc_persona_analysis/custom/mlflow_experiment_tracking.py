@@ -3,19 +3,17 @@ if 'custom' not in globals():
 if 'test' not in globals():
     from mage_ai.data_preparation.decorators import test
 
-import pandas as pd
 import mlflow
 import mlflow.pyfunc
 
-from tqdm import tqdm
-
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
-
 import requests
-import sys
+from sqlalchemy import create_engine
 import os
 
+from dtc_persona_analysis.utils.kmeans_sweep import run_sweep, search_best_run
+from dtc_persona_analysis.utils.streaming_training import DEFAULT_FETCH_SIZE, run_streaming_sweep
+from dtc_persona_analysis.utils.silhouette import SAMPLE_SIZE
+
 import logging
 # deactivated for debugging reasons
 # logging.getLogger("mlflow").setLevel(logging.ERROR) # Suppress the MLflow warning - It only shows warning below the ERROR level.
@@ -51,53 +49,46 @@ def transform_custom(data, *args, **kwargs):
 
     # Experiment tracking
 
-    with mlflow.start_run() as parent_run:
-    # Iterate over the range of clusters
-        for clusters in tqdm(range(2, 11)):
-            
-            # Start a new MLflow run for each cluster count
-            with mlflow.start_run(nested=True): #run_name=f"kmeans_basic_k={C}"):
-
-                # Log the input data   
-                mlflow.log_param("input_data_shape", X.shape)
-                mlflow.log_param("input_data_columns", list(X.columns))
-
-                # Instantiate your model
-                # MLflow will capture these parameters automatically
-                model = KMeans(n_clusters=clusters, n_init=10)#, random_state=42)
-                
-                # Fit the model
-                # MLflow intercepts this .fit() call to log metrics and artifacts
-                model.fit(X)
-
-                # inertia is the sum of squared distances to the nearest cluster center
-                # It is a measure of how tightly the clusters are packed
-                # Lower inertia means better clustering
-                mlflow.log_metric("inertia", model.inertia_)
-
-                # Log silhouette score, which measures how similar an object is to its own cluster compared to other clusters
-                # A higher silhouette score indicates better-defined clusters 
-                silhouette = silhouette_score(X, model.fit_predict(X))
-                mlflow.log_metric("silhouette", silhouette)
-
-                # Log the ratio of silhouette score to inertia
-                # This ratio can help assess the quality of clustering relative to the compactness of clusters
-                score = silhouette * 1000 / model.inertia_
-                mlflow.log_metric("silhouette_inertia_ratio", score)
-
-                # Log the number of clusters
-                mlflow.log_param("n_clusters", clusters)
-
-                # Log the model itself
-                mlflow.set_tag("run_purpose", "experiment from pipeline")
-        
-        experiment = mlflow.get_experiment_by_name(experiment_name)
-        runs = mlflow.search_runs(
-                                experiment_ids=[experiment.experiment_id],
-                                order_by=["metrics.silhouette_inertia_ratio DESC"],
-                                max_results=1
-                                )
-        best_run = runs.iloc[0]
+    # Every k is fitted once, one nested run per k (see utils/kmeans_sweep.py).
+    # Pipeline variable sweep_workers > 1 fits the k values in parallel processes,
+    # silhouette_estimator sampled / simplified scores large months in linear time
+    workers = int(kwargs.get('sweep_workers', 1))
+    streaming = kwargs.get('training_mode', 'batch') == 'streaming'
+    silhouette = kwargs.get('silhouette_estimator', 'simplified' if streaming else 'exact')
+    sample_size = int(kwargs.get('silhouette_sample_size', SAMPLE_SIZE))
+    if streaming:
+        # Out-of-core: the current month of the SQL loader (pipeline variables feature_table,
+        # current_start, current_end) is streamed from Postgres into MiniBatchKMeans
+        # (see utils/streaming_training.py), the silhouette is simplified or sampled.
+        # The loaders only return drift_sample_rows sampled rows per month (for the drift checks),
+        # X is not used.
+        # The models are logged by the sweep, autologging would hook every partial_fit
+        mlflow.sklearn.autolog(disable=True)
+        user = os.getenv("POSTGRES_USER")
+        password = os.getenv("POSTGRES_PASSWORD")
+        database = os.getenv("POSTGRES_DBNAME")
+        host = os.getenv("POSTGRES_HOST")
+        port = os.getenv("POSTGRES_PORT")
+        engine = create_engine(f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}")
+
+        _, results = run_streaming_sweep(
+            engine, kwargs['feature_table'], kwargs['current_start'], kwargs['current_end'], 2, 10,
+            run_purpose="experiment from pipeline",
+            epochs=int(kwargs.get('streaming_epochs', 1)),
+            fetch_size=int(kwargs.get('streaming_fetch_size', DEFAULT_FETCH_SIZE)),
+            silhouette=silhouette, sample_size=sample_size)
+    else:
+        _, results = run_sweep(X, 2, 10, run_purpose="experiment from pipeline", workers=workers,
+                               silhouette=silhouette, sample_size=sample_size)
+    for result in results:
+        print(f"k={result['n_clusters']}: fit {result['fit_seconds']:.2f}s, "
+              f"silhouette {result['silhouette_seconds']:.2f}s")
+
+    # Only runs scored with the same silhouette estimator are comparable
+    experiment = mlflow.get_experiment_by_name(experiment_name)
+    best_run = search_best_run([experiment.experiment_id], silhouette)
+    if best_run is None:
+        raise ValueError(f"No runs scored with the '{silhouette}' silhouette in {experiment_name}")
     
     token = os.environ.get('BOT_TOKEN')
     chat_id = os.environ.get('CHAT_ID')
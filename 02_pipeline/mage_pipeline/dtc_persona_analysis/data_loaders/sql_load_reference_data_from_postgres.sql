@@ -1,3 +1,14 @@
 -- Docs: https://docs.mage.ai/guides/sql-blocks
-select * from customer_features
-where extract(month from date) = 1 --{{ reference_month }};
\ No newline at end of file
+-- half-open date range, so Postgres can use the date index / prune month partitions
+-- pipeline variables feature_table, reference_start and reference_end
+-- training_mode streaming: the training streams the month itself, only a random sample of
+-- drift_sample_rows rows of the feature columns is loaded for the drift checks (top-N sort, bounded memory)
+{% if variables('training_mode') == 'streaming' %}
+select x1, x2, x3, x4, x5, x6, x7, x8, x9, x10 from {{ variables('feature_table') }}
+where date >= '{{ variables('reference_start') }}' and date < '{{ variables('reference_end') }}'
+order by random()
+limit {{ variables('drift_sample_rows') }};
+{% else %}
+select * from {{ variables('feature_table') }}
+where date >= '{{ variables('reference_start') }}' and date < '{{ variables('reference_end') }}';
+{% endif %}
@@ -0,0 +1,193 @@
+"""
+KMeans sweep over the number of clusters, logged to MLflow.
+
+Shared by the training script 01_model/model_experiment_tracking.py and the Mage block
+custom/mlflow_experiment_tracking.py. Every k is fitted once: the silhouette is scored
+on the labels_ of that fit, so inertia, silhouette and the logged model all describe
+the same clustering (refitting for the silhouette doubled the training time and scored
+a different clustering than the one logged).
+
+Every k is logged as a nested run of one parent run with the metrics
+
+    inertia                    sum of squared distances to the nearest center
+    silhouette                 mean silhouette coefficient of the fitted labels, by the
+                               silhouette_estimator param: exact, sampled (with
+                               silhouette_ci_low / silhouette_ci_high) or simplified,
+                               see silhouette.py
+    silhouette_inertia_ratio   silhouette * 1000 / inertia, the selection metric
+    fit_seconds                duration of the KMeans fit
+    silhouette_seconds         duration of the silhouette scoring
+
+and the parent run records the duration of the whole sweep as sweep_seconds.
+search_best_run picks the best k by silhouette_inertia_ratio among the runs scored
+with the same silhouette estimator, as the estimators are not comparable.
+
+With workers > 1 the k values are fitted concurrently in a process pool. The input is
+copied once into shared memory, which every worker maps read-only instead of receiving
+a pickled copy per task, and every worker is limited to its share of the CPU threads.
+The workers only fit and score; they send the metrics and fitted models back and the
+parent logs the nested runs, with the model logged by mlflow.sklearn.log_model under
+the same "model" artifact path autologging uses. The sweep then takes about as long as
+the slowest k instead of the sum of all. KMeans still centers a private copy of the
+data during every fit, so peak memory grows with the number of workers.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import mlflow
+import mlflow.sklearn
+import numpy as np
+import pandas as pd
+from mlflow.models import infer_signature
+from sklearn.cluster import KMeans
+from threadpoolctl import threadpool_limits
+from tqdm import tqdm
+
+from dtc_persona_analysis.utils.silhouette import SAMPLE_SIZE, estimate_silhouette, estimator_params
+
+# Per worker process: the shared input and the thread limit (see init_worker)
+_shared = {}
+
+
+def evaluate_k(X, n_clusters, n_init=10, random_state=None, silhouette="exact", sample_size=SAMPLE_SIZE, seed=0):
+    """
+    Fit KMeans with n_clusters once and score the fitted clustering, the silhouette
+    with the estimator silhouette (see silhouette.py).
+    Returns:
+        (KMeans, dict): The fitted model and its metrics.
+    """
+    start = time.perf_counter()
+    model = KMeans(n_clusters=n_clusters, n_init=n_init, random_state=random_state)
+    model.fit(X)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = estimate_silhouette(X, model, silhouette, sample_size=sample_size, seed=seed)
+    silhouette_seconds = time.perf_counter() - start
+
+    metrics = {
+        "inertia": model.inertia_,
+        **scores,
+        "silhouette_inertia_ratio": scores["silhouette"] * 1000 / model.inertia_,
+        "fit_seconds": fit_seconds,
+        "silhouette_seconds": silhouette_seconds,
+    }
+    return model, metrics
+
+
+def log_k_run(shape, columns, n_clusters, metrics, run_purpose, silhouette_params):
+    """Log the parameters, metrics and tag of one k, fitted on data of shape, into the active (nested) run."""
+    mlflow.log_param("input_data_shape", shape)
+    mlflow.log_param("input_data_columns", list(columns))
+    mlflow.log_param("n_clusters", n_clusters)
+    mlflow.log_params(silhouette_params)
+    mlflow.log_metrics(metrics)
+    mlflow.set_tag("run_purpose", run_purpose)
+
+
+def init_worker(name, shape, dtype, columns, threads):
+    """Process pool initializer: map the shared input read-only and limit the threads."""
+    # Fits are logged by the parent, an inherited autolog would start runs of its own
+    mlflow.sklearn.autolog(disable=True)
+    memory = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+    array.flags.writeable = False
+    _shared["memory"] = memory
+    _shared["X"] = pd.DataFrame(array, columns=columns, copy=False)
+    _shared["limits"] = threadpool_limits(limits=threads)
+
+
+def evaluate_shared_k(n_clusters, options):
+    """evaluate_k on the shared input of a pool worker. Returns (n_clusters, model, metrics)."""
+    model, metrics = evaluate_k(_shared["X"], n_clusters, **options)
+    return n_clusters, model, metrics
+
+
+def evaluate_parallel(X, k_values, workers, **options):
+    """
+    Fit and score every k in k_values in a pool of workers processes, options are
+    passed on to evaluate_k. Yields (n_clusters, model, metrics) as the fits complete.
+    """
+    array = np.ascontiguousarray(X.to_numpy(dtype=np.float64))
+    memory = shared_memory.SharedMemory(create=True, size=array.nbytes)
+    try:
+        np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[:] = array
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        initargs = (memory.name, array.shape, array.dtype.str, list(X.columns), threads)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as pool:
+            # Largest k first, they take longest
+            futures = [pool.submit(evaluate_shared_k, k, options) for k in sorted(k_values, reverse=True)]
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def log_model(X, model):
+    """
+    Log a model fitted outside of autologging (parallel or streaming sweep) into the
+    active run like autologging does, with the signature inferred from the first rows of X.
+    """
+    mlflow.log_params(model.get_params())
+    example = X.head(5)
+    mlflow.sklearn.log_model(model, "model", signature=infer_signature(example, model.predict(example)))
+
+
+def run_sweep(X, k_min=2, k_max=10, run_purpose="script test", n_init=10, random_state=None, workers=1,
+              silhouette="exact", sample_size=SAMPLE_SIZE, seed=0):
+    """
+    Fit and log KMeans for every k in [k_min, k_max], one nested run per k, the
+    silhouette scored with the estimator silhouette (see silhouette.py).
+    With workers > 1 the k values are fitted in parallel and the parent logs the runs and
+    models; otherwise they are fitted in turn and, with mlflow.sklearn.autolog() enabled,
+    the fit of every k is autologged into its run.
+    Args:
+        X (pd.DataFrame): DataFrame containing the data to cluster.
+    Returns:
+        (str, list): The parent run id and the metrics of every k (with n_clusters and run_id).
+    """
+    k_values = range(k_min, k_max + 1)
+    workers = min(workers, len(k_values))
+    options = {"n_init": n_init, "random_state": random_state, "silhouette": silhouette,
+               "sample_size": sample_size, "seed": seed}
+    silhouette_params = estimator_params(silhouette, sample_size=sample_size, seed=seed)
+    results = []
+    start = time.perf_counter()
+    with mlflow.start_run() as parent_run:
+        mlflow.log_param("sweep_workers", workers)
+        mlflow.log_params(silhouette_params)
+        if workers > 1:
+            evaluated = evaluate_parallel(X, k_values, workers, **options)
+            for n_clusters, model, metrics in tqdm(evaluated, total=len(k_values)):
+                with mlflow.start_run(nested=True) as run:
+                    log_k_run(X.shape, X.columns, n_clusters, metrics, run_purpose, silhouette_params)
+                    log_model(X, model)
+                results.append({"n_clusters": n_clusters, "run_id": run.info.run_id, **metrics})
+        else:
+            for n_clusters in tqdm(k_values):
+                with mlflow.start_run(nested=True) as run:
+                    _, metrics = evaluate_k(X, n_clusters, **options)
+                    log_k_run(X.shape, X.columns, n_clusters, metrics, run_purpose, silhouette_params)
+                results.append({"n_clusters": n_clusters, "run_id": run.info.run_id, **metrics})
+        mlflow.log_metric("sweep_seconds", time.perf_counter() - start)
+    return parent_run.info.run_id, sorted(results, key=lambda result: result["n_clusters"])
+
+
+def search_best_run(experiment_ids, silhouette="exact"):
+    """
+    Find the run with the best silhouette_inertia_ratio among the runs whose silhouette
+    was scored with the estimator silhouette (runs logged before the estimator was
+    recorded count as exact).
+    Returns:
+        pd.Series: The best run as returned by mlflow.search_runs, None if there is none.
+    """
+    runs = mlflow.search_runs(experiment_ids=experiment_ids, order_by=["metrics.silhouette_inertia_ratio DESC"])
+    if runs.empty or "metrics.silhouette_inertia_ratio" not in runs:
+        return None
+    estimators = runs.get("params.silhouette_estimator", pd.Series("exact", index=runs.index)).fillna("exact")
+    runs = runs[(estimators == silhouette) & runs["metrics.silhouette_inertia_ratio"].notna()]
+    return None if runs.empty else runs.iloc[0]
@@ -0,0 +1,133 @@
+"""
+Silhouette estimators for the k-sweep (see kmeans_sweep.py).
+
+The exact silhouette compares every row with every other row, O(n^2) time, and
+becomes the bottleneck of the sweep once a month has more than ~100k rows. Estimators:
+
+    exact       sklearn's silhouette_score
+    sampled     exact silhouette coefficients of sample_size random rows (reproducible
+                with seed), each measured against all n rows, O(sample_size * n). Their
+                mean is an unbiased estimate of the exact score, reported with a normal
+                confidence interval.
+    simplified  centroid ("simplified") silhouette: the distances to the own and the
+                nearest other cluster center replace the mean distances to the members
+                of those clusters, O(n * k). Not the same quantity as the exact score,
+                usually somewhat higher, but it ranks clusterings alike.
+
+Runs scored with different estimators should not be compared with each other, which
+is why the estimator is logged with every run.
+"""
+
+import statistics
+
+import numpy as np
+from sklearn.metrics import pairwise_distances_chunked, silhouette_score
+from sklearn.metrics.pairwise import euclidean_distances
+
+ESTIMATORS = ["exact", "sampled", "simplified"]
+SAMPLE_SIZE = 2000
+CONFIDENCE = 0.95
+
+
+def coefficients_from_sums(sums, counts, own):
+    """
+    Silhouette coefficients of sample rows from their summed distances to the members
+    of every cluster (sums, one row per sample row), the cluster sizes (counts) and the
+    clusters of the sample rows (own).
+    """
+    rows = np.arange(len(sums))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # The own cluster's mean excludes the row itself (distance 0)
+        a = sums[rows, own] / (counts[own] - 1)
+        # Empty clusters (possible with MiniBatchKMeans) are never the nearest one
+        means = np.where(counts > 0, sums / counts, np.inf)
+        means[rows, own] = np.inf
+        b = means.min(axis=1)
+        coefficients = np.nan_to_num((b - a) / np.maximum(a, b))
+    # Like sklearn: 0 for rows alone in their cluster
+    coefficients[counts[own] == 1] = 0
+    return coefficients
+
+
+def mean_interval(coefficients, n, confidence=CONFIDENCE):
+    """
+    Mean of the coefficients of a random sample of n rows and its normal confidence interval.
+    Returns:
+        (float, float, float): The estimate and the lower and upper confidence bounds.
+    """
+    estimate = float(coefficients.mean())
+    if len(coefficients) < 2:
+        return estimate, estimate, estimate
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    # Finite population correction, the interval closes when the sample is all rows
+    half_width = z * coefficients.std(ddof=1) / np.sqrt(len(coefficients)) * np.sqrt(1 - len(coefficients) / n)
+    return estimate, float(estimate - half_width), float(estimate + half_width)
+
+
+def sampled_silhouette(X, labels, sample_size=SAMPLE_SIZE, seed=0, confidence=CONFIDENCE):
+    """
+    Estimate the silhouette score from the coefficients of sample_size random rows.
+    Returns:
+        (float, float, float): The estimate and the lower and upper confidence bounds.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    _, labels = np.unique(np.asarray(labels), return_inverse=True)
+    labels = labels.ravel()
+    n = len(X)
+    sample = np.random.default_rng(seed).choice(n, size=min(sample_size, n), replace=False)
+
+    # Rows sorted by cluster, so the distances to a cluster's members are one slice
+    counts = np.bincount(labels)
+    order = np.argsort(labels, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    def cluster_sums(distances, start):
+        return np.add.reduceat(distances, starts, axis=1)
+
+    # Chunked by sklearn's working_memory, a chunk holds some sample rows x all n distances
+    sums = np.vstack(list(pairwise_distances_chunked(X[sample], X[order], reduce_func=cluster_sums)))
+    coefficients = coefficients_from_sums(sums, counts, labels[sample])
+    return mean_interval(coefficients, n, confidence)
+
+
+def simplified_coefficients(distances, labels):
+    """Simplified silhouette coefficients from the (n, k) distances of rows to the cluster centers."""
+    rows = np.arange(len(distances))
+    a = distances[rows, labels]
+    others = distances.copy()
+    others[rows, labels] = np.inf
+    b = others.min(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.nan_to_num((b - a) / np.maximum(a, b))
+
+
+def simplified_silhouette(X, labels, centers):
+    """Centroid-based silhouette of the clustering with the given labels and centers, O(n * k)."""
+    distances = euclidean_distances(np.asarray(X, dtype=np.float64), centers)
+    return float(simplified_coefficients(distances, labels).mean())
+
+
+def estimate_silhouette(X, model, estimator="exact", sample_size=SAMPLE_SIZE, seed=0):
+    """
+    Score the silhouette of a fitted KMeans model with the estimator.
+    Returns:
+        dict: silhouette, and silhouette_ci_low / silhouette_ci_high for the sampled estimator.
+    """
+    if estimator == "exact":
+        return {"silhouette": silhouette_score(X, model.labels_)}
+    if estimator == "sampled":
+        estimate, low, high = sampled_silhouette(X, model.labels_, sample_size=sample_size, seed=seed)
+        return {"silhouette": estimate, "silhouette_ci_low": low, "silhouette_ci_high": high}
+    if estimator == "simplified":
+        return {"silhouette": simplified_silhouette(X, model.labels_, model.cluster_centers_)}
+    raise ValueError(f"Unknown silhouette estimator '{estimator}', expected one of {ESTIMATORS}")
+
+
+def estimator_params(estimator, sample_size=SAMPLE_SIZE, seed=0):
+    """The MLflow params recording which silhouette estimator scored a run."""
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Unknown silhouette estimator '{estimator}', expected one of {ESTIMATORS}")
+    params = {"silhouette_estimator": estimator}
+    if estimator == "sampled":
+        params.update(silhouette_sample_size=sample_size, silhouette_seed=seed, silhouette_confidence=CONFIDENCE)
+    return params
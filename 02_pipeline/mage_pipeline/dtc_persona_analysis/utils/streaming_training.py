@@ -0,0 +1,257 @@
+"""
+Out-of-core KMeans sweep streamed from Postgres, logged to MLflow like kmeans_sweep.py.
+
+The batch sweep needs the whole month as one DataFrame in the memory of the pipeline
+worker. The streaming sweep instead reads the feature columns of the month through a
+server-side (named) cursor, fetch_size rows at a time, and never holds more than one
+chunk of the month:
+
+    training    every chunk updates one MiniBatchKMeans per k with partial_fit, so a
+                pass over the month trains all k values at once; epochs > 1 repeats
+                the pass (the query is run again)
+    scoring     one more pass computes the inertia over all rows and the silhouette of
+                every k from per-chunk sums
+
+The silhouette can only be scored with the linear estimators of silhouette.py:
+simplified (the default) or sampled, whose sample_size rows are drawn uniformly during
+the first training pass (smallest random keys, reproducible with seed) and measured
+against all rows in the scoring pass. exact needs all rows in memory and is rejected.
+
+Every k is logged as a nested run with the same params and metrics as the batch sweep
+(inertia, silhouette, silhouette_inertia_ratio, fit_seconds, silhouette_seconds) and
+the model under the "model" artifact path, so the best-run search and registration
+(runs:/<run_id>/model) work unchanged. The runs and the parent record
+training_mode=streaming; the parent also logs the streamed rows, the epochs, the fetch
+size, sweep_seconds and read_seconds (time spent waiting for the database).
+
+MiniBatchKMeans converges best on batches in random order; rows come in the order the
+table returns them, which for a month loaded file by file is close to insertion order.
+"""
+
+import time
+
+import mlflow
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics.pairwise import euclidean_distances
+from tqdm import tqdm
+
+from dtc_persona_analysis.utils.kmeans_sweep import log_k_run, log_model
+from dtc_persona_analysis.utils.silhouette import (
+    SAMPLE_SIZE,
+    coefficients_from_sums,
+    estimator_params,
+    mean_interval,
+    simplified_coefficients,
+)
+
+FEATURE_COLUMNS = ["x1", "x2", "x3", "x4", "x5", "x6", "x7", "x8", "x9", "x10"]
+
+# Silhouette estimators that can be scored from per-chunk sums
+STREAMING_ESTIMATORS = ["simplified", "sampled"]
+
+# Default number of rows fetched per round-trip from the server-side cursor
+DEFAULT_FETCH_SIZE = 50_000
+
+# Memory budget of one block of sample-to-chunk distances of the sampled estimator
+DISTANCE_BLOCK_BYTES = 64 * 2**20
+
+
+def check_estimator(silhouette):
+    """Raise a ValueError unless the silhouette estimator can be used for streaming training."""
+    if silhouette not in STREAMING_ESTIMATORS:
+        raise ValueError(f"Streaming training cannot score the '{silhouette}' silhouette, "
+                         f"expected one of {STREAMING_ESTIMATORS}")
+
+
+def month_query(table_name, start, end):
+    """SELECT the feature columns of the half-open date range [start, end) of table_name."""
+    return f"""
+        SELECT {', '.join(FEATURE_COLUMNS)}
+        FROM {table_name}
+        WHERE date >= '{start}'
+        AND date < '{end}'
+    """
+
+
+def stream_features(engine, query, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+    Yield the result of query as float64 DataFrames of at most fetch_size rows.
+
+    Uses a psycopg2 named cursor, so rows stay on the server until they are fetched and
+    peak memory is bounded by fetch_size rather than by the size of the month.
+    """
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor(name="training_stream") as cursor:
+            cursor.itersize = fetch_size
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                columns = [desc[0] for desc in cursor.description]
+                yield pd.DataFrame.from_records(rows, columns=columns).astype(np.float64)
+        conn.rollback()  # read-only transaction, just release the snapshot
+    finally:
+        conn.close()
+
+
+class ReadTimer:
+    """Wrap a chunk iterator and add up the time spent waiting for the next chunk."""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __call__(self, chunks):
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            self.seconds += time.perf_counter() - start
+            if chunk is None:
+                return
+            yield chunk
+
+
+def update_sample(sample, keys, chunk, rng, sample_size):
+    """
+    Add the rows of chunk to the running uniform sample: every row gets a random key and
+    the sample_size rows with the smallest keys so far are kept.
+    """
+    chunk_keys = rng.random(len(chunk))
+    rows = np.vstack([sample, chunk])
+    keys = np.concatenate([keys, chunk_keys])
+    if len(keys) > sample_size:
+        keep = np.argpartition(keys, sample_size)[:sample_size]
+        rows, keys = rows[keep], keys[keep]
+    return rows, keys
+
+
+def sample_cluster_sums(sample, chunk, labels, n_clusters):
+    """Summed distances of every sample row to the rows of chunk in each cluster, (len(sample), n_clusters)."""
+    one_hot = np.eye(n_clusters)[labels]
+    block = max(1, DISTANCE_BLOCK_BYTES // (8 * len(sample)))
+    sums = np.zeros((len(sample), n_clusters))
+    for begin in range(0, len(chunk), block):
+        sums += euclidean_distances(sample, chunk[begin:begin + block]) @ one_hot[begin:begin + block]
+    return sums
+
+
+def fit_streaming(chunks, k_values, epochs=1, random_state=None, silhouette="simplified",
+                  sample_size=SAMPLE_SIZE, seed=0):
+    """
+    Train one MiniBatchKMeans per k over epochs passes of chunks() and score them in a
+    final pass, the silhouette with the estimator silhouette (simplified or sampled).
+    Args:
+        chunks (callable): Returns a new iterator over the feature DataFrames of the data.
+    Returns:
+        (dict, dict, int, pd.DataFrame): The models and metrics by k, the number of rows
+        and the first rows of the data (for the model signature).
+    """
+    check_estimator(silhouette)
+    models = {k: MiniBatchKMeans(n_clusters=k, random_state=random_state) for k in k_values}
+    fit_seconds = dict.fromkeys(k_values, 0.0)
+    rng = np.random.default_rng(seed)
+    sample, keys = np.empty((0, len(FEATURE_COLUMNS))), np.empty(0)
+    n_rows, example = 0, None
+    # The first partial_fit initializes the centers and needs at least n_clusters rows,
+    # small fetches are buffered until the largest k can be initialized
+    min_rows, pending = max(k_values), []
+
+    for epoch in range(epochs):
+        for chunk in chunks():
+            if epoch == 0:
+                n_rows += len(chunk)
+                if example is None:
+                    example = chunk.head(5)
+                if silhouette == "sampled":
+                    sample, keys = update_sample(sample, keys, chunk.to_numpy(), rng, sample_size)
+            if pending is not None:
+                pending.append(chunk)
+                if sum(len(part) for part in pending) < min_rows:
+                    continue
+                chunk, pending = pd.concat(pending, ignore_index=True), None
+            for k, model in models.items():
+                start = time.perf_counter()
+                model.partial_fit(chunk)
+                fit_seconds[k] += time.perf_counter() - start
+        if n_rows == 0:
+            raise ValueError("No rows to train on")
+        if pending is not None:
+            raise ValueError(f"{n_rows} rows are too few to fit {min_rows} clusters")
+
+    inertia = dict.fromkeys(k_values, 0.0)
+    silhouette_sums = dict.fromkeys(k_values, 0.0)
+    distance_sums = {k: np.zeros((len(sample), k)) for k in k_values}
+    counts = {k: np.zeros(k, dtype=np.int64) for k in k_values}
+    silhouette_seconds = dict.fromkeys(k_values, 0.0)
+    for chunk in chunks():
+        chunk = chunk.to_numpy()
+        for k, model in models.items():
+            start = time.perf_counter()
+            distances = euclidean_distances(chunk, model.cluster_centers_)
+            labels = distances.argmin(axis=1)
+            inertia[k] += float(np.square(distances[np.arange(len(chunk)), labels]).sum())
+            if silhouette == "simplified":
+                silhouette_sums[k] += float(simplified_coefficients(distances, labels).sum())
+            else:
+                distance_sums[k] += sample_cluster_sums(sample, chunk, labels, k)
+                counts[k] += np.bincount(labels, minlength=k)
+            silhouette_seconds[k] += time.perf_counter() - start
+
+    metrics = {}
+    for k, model in models.items():
+        start = time.perf_counter()
+        if silhouette == "simplified":
+            scores = {"silhouette": silhouette_sums[k] / n_rows}
+        else:
+            own = euclidean_distances(sample, model.cluster_centers_).argmin(axis=1)
+            coefficients = coefficients_from_sums(distance_sums[k], counts[k], own)
+            estimate, low, high = mean_interval(coefficients, n_rows)
+            scores = {"silhouette": estimate, "silhouette_ci_low": low, "silhouette_ci_high": high}
+        silhouette_seconds[k] += time.perf_counter() - start
+        metrics[k] = {
+            "inertia": inertia[k],
+            **scores,
+            "silhouette_inertia_ratio": scores["silhouette"] * 1000 / inertia[k],
+            "fit_seconds": fit_seconds[k],
+            "silhouette_seconds": silhouette_seconds[k],
+        }
+    return models, metrics, n_rows, example
+
+
+def run_streaming_sweep(engine, table_name, start, end, k_min=2, k_max=10, run_purpose="script test",
+                        epochs=1, fetch_size=DEFAULT_FETCH_SIZE, random_state=None,
+                        silhouette="simplified", sample_size=SAMPLE_SIZE, seed=0):
+    """
+    Train and log MiniBatchKMeans for every k in [k_min, k_max] on the rows of table_name
+    in the date range [start, end), streamed from Postgres, one nested run per k.
+    Returns:
+        (str, list): The parent run id and the metrics of every k (with n_clusters and run_id).
+    """
+    check_estimator(silhouette)
+    k_values = range(k_min, k_max + 1)
+    silhouette_params = estimator_params(silhouette, sample_size=sample_size, seed=seed)
+    query = month_query(table_name, start, end)
+    read_timer = ReadTimer()
+    results = []
+    sweep_start = time.perf_counter()
+    with mlflow.start_run() as parent_run:
+        mlflow.log_params({"training_mode": "streaming", "streaming_epochs": epochs, "fetch_size": fetch_size})
+        mlflow.log_params(silhouette_params)
+        models, metrics, n_rows, example = fit_streaming(
+            lambda: read_timer(stream_features(engine, query, fetch_size)), k_values, epochs=epochs,
+            random_state=random_state, silhouette=silhouette, sample_size=sample_size, seed=seed)
+        for n_clusters in tqdm(k_values):
+            with mlflow.start_run(nested=True) as run:
+                log_k_run((n_rows, len(FEATURE_COLUMNS)), FEATURE_COLUMNS, n_clusters, metrics[n_clusters],
+                          run_purpose, silhouette_params)
+                mlflow.log_params({"training_mode": "streaming", "streaming_epochs": epochs})
+                log_model(example, models[n_clusters])
+            results.append({"n_clusters": n_clusters, "run_id": run.info.run_id, **metrics[n_clusters]})
+        mlflow.log_param("streamed_rows", n_rows)
+        mlflow.log_metrics({"sweep_seconds": time.perf_counter() - sweep_start,
+                            "read_seconds": read_timer.seconds})
+    return parent_run.info.run_id, results
@@ -0,0 +1,129 @@
+"""
+ASGI variant of gunicorn_predict_registry with request micro-batching.
+
+Concurrent /predict requests are coalesced into one vectorized prediction (see
+micro_batcher.py). Model loading, the local model cache and hot reload are those of
+gunicorn_predict_registry; the request and response formats are the same (payload.py).
+Every worker warms up at startup, before uvicorn accepts connections (see warmup.py).
+
+Run with:
+    uvicorn asgi_predict_registry:app --host 0.0.0.0 --port 9998 --workers 2
+
+Configuration:
+    BATCH_MAX_ROWS     rows that close a micro-batch early (default 4096)
+    BATCH_MAX_WAIT_MS  milliseconds a micro-batch stays open (default 2)
+"""
+
+import os
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from gunicorn_predict_registry import MODEL_NAME, MODEL_STAGE, model, reloader
+from micro_batcher import MicroBatcher
+from payload import (
+    JSON_MIMETYPE,
+    NPY_MIMETYPE,
+    PayloadError,
+    check_shape,
+    decode_array,
+    encode_labels,
+    records_to_array,
+)
+from serving_metrics import metrics_response, track_request
+from warmup import Warmup, asgi_sender, is_warmup, signature_columns
+
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "4096"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "2"))
+
+
+def predict_batch(features):
+    # One read of the active pair per batch, all requests of a batch see the same version
+    version, predictor = reloader.active
+    return version, predictor.predict(features)
+
+
+# Requests are checked before they join a batch, a malformed one cannot fail the others
+batcher = MicroBatcher(predict_batch, max_rows=BATCH_MAX_ROWS, max_wait=BATCH_MAX_WAIT_MS / 1000,
+                       validate=check_shape)
+warmup = Warmup(signature_columns(model))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    reloader.start()
+    await batcher.start()
+    # uvicorn only accepts connections once the startup is complete
+    await warmup.run_async(asgi_sender(app))
+    yield
+    await batcher.stop()
+
+
+async def predict_labels(request):
+    """
+    Predict persona labels for input features.
+    Expects a JSON array of feature dicts, or a binary body (.npy / Arrow IPC, see payload.py).
+    Returns: JSON with predicted labels and the model version, or a packed int32 .npy array
+    if requested via Accept. The model version is also sent in the X-Model-Version header.
+    """
+    mimetype = request.headers.get("content-type", JSON_MIMETYPE).split(";")[0].strip()
+    # Warm-up requests (see warmup.py) are not recorded
+    with track_request(record=not is_warmup(request.scope)) as timer:
+        try:
+            with timer.phase("parse"):
+                if mimetype == JSON_MIMETYPE:
+                    try:
+                        records = await request.json()
+                    except ValueError as e:
+                        raise PayloadError(f"Invalid JSON body: {e}")
+                    features = records_to_array(records)
+                else:
+                    features = decode_array(await request.body(), mimetype)
+        except PayloadError as e:
+            timer.outcome = "client_error"
+            return JSONResponse({"error": str(e)}, status_code=e.status)
+        timer.rows = len(features)
+        # Includes the wait for the micro-batch window
+        with timer.phase("predict"):
+            version, predictions_nparray = await batcher.predict(features)
+        with timer.phase("serialize"):
+            headers = {"X-Model-Version": str(version)}
+            if NPY_MIMETYPE in request.headers.get("accept", ""):
+                return Response(encode_labels(predictions_nparray), media_type=NPY_MIMETYPE, headers=headers)
+            return JSONResponse({"labels": predictions_nparray.tolist(), "model_version": version}, headers=headers)
+
+
+async def status(request):
+    """Report the model version served by this worker and the micro-batching statistics."""
+    return JSONResponse({"model_name": MODEL_NAME, "model_stage": MODEL_STAGE, **reloader.status(),
+                         "micro_batching": batcher.stats()})
+
+
+async def healthz(request):
+    """Liveness: the worker process is running."""
+    return JSONResponse({"status": "ok"})
+
+
+async def ready(request):
+    """Readiness: 200 once this worker is warmed up (see warmup.py), 503 before."""
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
+
+async def metrics(request):
+    """Prometheus metrics aggregated over all workers (see serving_metrics.py)."""
+    body, content_type = metrics_response()
+    return Response(body, headers={"Content-Type": content_type})
+
+
+app = Starlette(
+    routes=[
+        Route("/predict", predict_labels, methods=["POST"]),
+        Route("/status", status, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/healthz", healthz, methods=["GET"]),
+        Route("/ready", ready, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,214 @@
+"""
+Shared database helpers for the batch prediction scripts.
+
+The batch scripts (batch_locally_predict_from_db.py and batch_app_predict_from_db.py)
+write the predicted persona back to the feature table. Instead of one UPDATE round-trip
+per row, the helpers here stage (key, persona) pairs into a temporary table via COPY and
+apply them with a single set-based UPDATE ... FROM join.
+
+update_database picks the update key of the rows read (customer_id, the physical row
+identity or, as a last resort, all feature columns and date) and writes the personas
+back in bulk or, with write_mode 'row', with one UPDATE per row.
+
+For months that do not fit into memory, stream_query reads the month through a
+server-side (named) cursor in fixed-size chunks.
+
+Tables without customer_id are read together with the physical identity of every row
+(ROW_ID_COLUMNS), so the write-back is a direct tuple lookup instead of a match on all
+float feature columns.
+"""
+
+import io
+import logging
+import time
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+FEATURE_COLUMNS = ["x1", "x2", "x3", "x4", "x5", "x6", "x7", "x8", "x9", "x10"]
+
+# Default number of rows sent per COPY statement while staging the updates
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Default number of rows fetched per round-trip from the server-side cursor
+DEFAULT_FETCH_SIZE = 50_000
+
+# Temporary table the predictions are staged into (dropped on commit)
+STAGING_TABLE = "persona_updates"
+
+# Physical row identity selected for tables without customer_id, mapped to the system
+# column it is read from: the partition (tableoid), the tuple location (ctid) and the
+# inserting transaction (xmin). xmin changes whenever the row is updated, so a row that
+# was modified or moved since it was read is skipped instead of a wrong row being updated.
+ROW_ID_COLUMNS = {"row_tableoid": "tableoid", "row_ctid": "ctid", "row_xmin": "xmin"}
+
+
+def month_bounds(year, month):
+    """Return the half-open [start, end) date range covering one month."""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def month_query(engine, table_name, year, month, columns=None):
+    """
+    Build the SELECT for one month of table_name.
+
+    Selects customer_id (ordered) if the table has one, otherwise the physical row
+    identity (ROW_ID_COLUMNS), the feature columns and date. The month is filtered as a
+    half-open date range rather than with EXTRACT(), so Postgres can use an index on
+    date and prune month partitions. The table's columns are looked up unless the
+    caller already has them.
+    """
+    if columns is None:
+        columns = [col["name"] for col in inspect(engine).get_columns(table_name)]
+    if "customer_id" in columns:
+        select_columns = ["customer_id"] + FEATURE_COLUMNS + ["date"]
+        order_by = "ORDER BY customer_id"
+    else:
+        row_id = [f"{system} AS {col}" for col, system in ROW_ID_COLUMNS.items()]
+        select_columns = row_id + FEATURE_COLUMNS + ["date"]
+        order_by = ""
+    start, end = month_bounds(year, month)
+    query = f"""
+        SELECT {', '.join(select_columns)}
+        FROM {table_name}
+        WHERE date >= '{start.isoformat()}'
+        AND date < '{end.isoformat()}'
+        {order_by}
+    """
+    return query
+
+
+def stream_query(engine, query, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+    Yield the result of query as DataFrames of at most fetch_size rows.
+
+    Uses a psycopg2 named cursor, so rows stay on the server until they are fetched and
+    peak memory is bounded by fetch_size rather than by the size of the result.
+    """
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor(name="persona_stream") as cursor:
+            cursor.itersize = fetch_size
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                columns = [desc[0] for desc in cursor.description]
+                yield pd.DataFrame.from_records(rows, columns=columns)
+        conn.rollback()  # read-only transaction, just release the snapshot
+    finally:
+        conn.close()
+
+
+def key_expression(column):
+    """Return the target table expression a key column is matched against."""
+    return ROW_ID_COLUMNS.get(column, column)
+
+
+def copy_frame(cursor, df, table_name, columns):
+    """Stream the given DataFrame columns into a table with COPY FROM STDIN (CSV)."""
+    buffer = io.StringIO()
+    df.to_csv(buffer, columns=columns, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
+def bulk_update_personas(engine, df, table_name, key_columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write the 'persona' column of df back to table_name in one set-based UPDATE.
+
+    The rows are staged chunk by chunk into a temporary table that mirrors the column
+    types of the target table, then joined on key_columns in a single UPDATE ... FROM.
+    Key columns from ROW_ID_COLUMNS are matched against the system columns they were
+    read from. Returns the number of updated rows.
+    """
+    columns = list(key_columns) + ["persona"]
+    staged = df[list(key_columns)].copy()
+    staged["persona"] = df["persona"].astype(int)
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            # Mirror the key/persona column types of the target table
+            select_list = ", ".join(f"{key_expression(col)} AS {col}" for col in columns)
+            cursor.execute(f"""
+                CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP AS
+                SELECT {select_list} FROM {table_name} WITH NO DATA
+            """)
+            for start in range(0, len(staged), chunk_size):
+                copy_frame(cursor, staged.iloc[start:start + chunk_size], STAGING_TABLE, columns)
+            # Give the planner row estimates so it picks a hash join
+            cursor.execute(f"ANALYZE {STAGING_TABLE}")
+            join_condition = " AND ".join(f"t.{key_expression(col)} = s.{col}" for col in key_columns)
+            cursor.execute(f"""
+                UPDATE {table_name} AS t
+                SET persona = s.persona
+                FROM {STAGING_TABLE} AS s
+                WHERE {join_condition}
+            """)
+            updated = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return updated
+
+
+def update_database(engine, df, table_name, write_mode="bulk", chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Update table_name with the persona predictions of df. Returns the elapsed seconds.
+    Errors are left to the calling script, which logs them and exits.
+    """
+    logger.info(f"Updating {table_name} with predictions ({write_mode} mode)...")
+    start = time.perf_counter()
+
+    if "customer_id" in df.columns:
+        key_columns = ["customer_id"]
+    elif set(ROW_ID_COLUMNS).issubset(df.columns):
+        # No customer_id, but the rows were read with their physical identity:
+        # every update is a direct tuple lookup (tableoid, ctid), guarded by xmin
+        logger.info("No customer_id found, using the physical row identity for updates")
+        key_columns = list(ROW_ID_COLUMNS)
+    else:
+        # If no customer_id, we'll use a combination of features and date to identify unique records
+        logger.info("No customer_id found, using feature-based matching for updates")
+        key_columns = FEATURE_COLUMNS + ["date"]
+
+    if write_mode == "bulk":
+        # Stage (key, persona) via COPY and apply a single set-based UPDATE ... FROM
+        updated = bulk_update_personas(engine, df, table_name, key_columns, chunk_size)
+        logger.info(f"Bulk update matched {updated} rows")
+        if updated < len(df) and key_columns == list(ROW_ID_COLUMNS):
+            # Only the row identity is guarded by xmin: rows modified since they were read are skipped
+            logger.warning(f"{len(df) - updated} rows changed since they were read and were not updated")
+    else:
+        with engine.connect() as conn:
+            # One UPDATE per row, matching on the key columns
+            where_clause = " AND ".join(f"{key_expression(col)} = :{col}" for col in key_columns)
+            update_query = text(f"""
+                UPDATE {table_name}
+                SET persona = :persona
+                WHERE {where_clause}
+            """)
+
+            for _, row in df.iterrows():
+                params = {col: row[col] for col in key_columns}
+                params["persona"] = int(row["persona"])
+                conn.execute(update_query, params)
+
+            conn.commit()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"✅ Successfully updated {len(df)} records in {table_name}")
+    return elapsed
@@ -15,14 +15,24 @@ Examples:
 
 import pandas as pd
 import mlflow
+from mlflow.tracking import MlflowClient
 import sys
 import logging
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import create_engine, inspect
 from dotenv import load_dotenv
 import os
 from datetime import datetime
 import argparse
 
+from batch_db import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_FETCH_SIZE,
+    month_query,
+    stream_query,
+    update_database,
+)
+from model_cache import registry_model_path
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -76,6 +86,35 @@ Examples:
         help='Name of the table to query and update (e.g., customer_features_test2)'
     )
     
+    parser.add_argument(
+        '--write-mode',
+        choices=['bulk', 'row'],
+        default='bulk',
+        help='bulk: stage predictions via COPY and apply one UPDATE ... FROM (default); '
+             'row: one UPDATE statement per row'
+    )
+    
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'Rows per COPY chunk in bulk write mode (default: {DEFAULT_CHUNK_SIZE})'
+    )
+    
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Read the month through a server-side cursor and predict/write back chunk by chunk, '
+             'so memory is bounded by --fetch-size instead of the month size'
+    )
+    
+    parser.add_argument(
+        '--fetch-size',
+        type=int,
+        default=DEFAULT_FETCH_SIZE,
+        help=f'Rows per server-side cursor fetch in streaming mode (default: {DEFAULT_FETCH_SIZE})'
+    )
+    
     return parser.parse_args()
 
 
@@ -94,13 +133,20 @@ def validate_date(year, month):
 
 
 def load_model():
-    """Load the MLflow model for predictions."""
+    """
+    Load the MLflow model for predictions.
+    Repeated runs load the resolved version from the local model cache (see model_cache.py).
+    """
     try:
         logger.info(f"Connecting to MLflow Tracking Server at: {MLFLOW_TRACKING_URI}")
         mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
         
         logger.info(f"Loading model '{MODEL_NAME}' from stage '{MODEL_STAGE}'...")
-        model = mlflow.pyfunc.load_model(model_uri=MODEL_URI)
+        versions = MlflowClient().get_latest_versions(MODEL_NAME, stages=[MODEL_STAGE])
+        if not versions:
+            raise mlflow.exceptions.MlflowException(f"No version of '{MODEL_NAME}' in stage '{MODEL_STAGE}'")
+        model = mlflow.pyfunc.load_model(registry_model_path(MODEL_NAME, versions[0].version))
+        logger.info(f"Model version: {versions[0].version}")
         
         logger.info("✅ Model loaded successfully!")
         return model
@@ -133,32 +179,12 @@ def query_data_by_month(engine, year, month, table_name):
         columns = [col['name'] for col in inspector.get_columns(table_name)]
         logger.info(f"Available columns in {table_name}: {columns}")
         
-        # Check if customer_id exists, if not, we'll use a different approach
-        if 'customer_id' in columns:
-            query = f"""
-            SELECT customer_id, {', '.join(FEATURE_COLUMNS)}, date
-            FROM {table_name}
-            WHERE EXTRACT(YEAR FROM date) = {year} 
-            AND EXTRACT(MONTH FROM date) = {month}
-            ORDER BY customer_id
-            """
-        else:
-            # If no customer_id, we'll use all available columns and create a temporary index
-            query = f"""
-            SELECT {', '.join(FEATURE_COLUMNS)}, date
-            FROM {table_name}
-            WHERE EXTRACT(YEAR FROM date) = {year} 
-            AND EXTRACT(MONTH FROM date) = {month}
-            """
+        # Selects customer_id if available, otherwise the physical row identity, features and date
+        query = month_query(engine, table_name, year, month, columns)
         
         logger.info(f"Querying data for {month}/{year} from {table_name}...")
         df = pd.read_sql(query, engine)
         
-        # Add a temporary index if no customer_id exists
-        if 'customer_id' not in df.columns:
-            df['temp_id'] = range(len(df))
-            logger.info("No customer_id column found, using temporary index")
-        
         logger.info(f"Retrieved {len(df)} records for {month}/{year} from {table_name}")
         return df
         
@@ -170,8 +196,8 @@ def query_data_by_month(engine, year, month, table_name):
 def make_predictions(model, df):
     """Make predictions using the loaded model."""
     try:
-        # Prepare features for prediction
-        features = df[FEATURE_COLUMNS].copy()
+        # Prepare features for prediction (column selection already yields a new frame)
+        features = df[FEATURE_COLUMNS]
         
         logger.info("Making predictions...")
         predictions = model.predict(features)
@@ -187,62 +213,46 @@ def make_predictions(model, df):
         sys.exit(1)
 
 
-def update_database(engine, df, table_name):
-    """Update the database with the new persona predictions."""
+def predict_streaming(engine, model, year, month, table_name, args):
+    """
+    Predict the month chunk by chunk: fetch, predict and write back each chunk
+    before the next one is read. Returns (total_records, write_seconds, persona_counts).
+    """
     try:
-        logger.info(f"Updating {table_name} with predictions...")
+        query = month_query(engine, table_name, year, month)
+        logger.info(f"Streaming data for {month}/{year} from {table_name} in chunks of {args.fetch_size}...")
         
-        with engine.connect() as conn:
-            if 'customer_id' in df.columns:
-                # Use customer_id for updates if available
-                for _, row in df.iterrows():
-                    update_query = text(f"""
-                        UPDATE {table_name}
-                        SET persona = :persona
-                        WHERE customer_id = :customer_id
-                    """)
-                    
-                    conn.execute(update_query, {
-                        'persona': int(row['persona']),
-                        'customer_id': row['customer_id']
-                    })
-            else:
-                # If no customer_id, we need to use a different approach
-                # We'll use a combination of features and date to identify unique records
-                logger.info("No customer_id found, using feature-based matching for updates")
-                
-                for _, row in df.iterrows():
-                    # Create a WHERE clause using all feature columns and date
-                    where_conditions = []
-                    params = {'persona': int(row['persona'])}
-                    
-                    for col in FEATURE_COLUMNS:
-                        where_conditions.append(f"{col} = :{col}")
-                        params[col] = row[col]
-                    
-                    # Add date condition
-                    where_conditions.append("date = :date")
-                    params['date'] = row['date']
-                    
-                    where_clause = " AND ".join(where_conditions)
-                    
-                    update_query = text(f"""
-                        UPDATE {table_name}
-                        SET persona = :persona
-                        WHERE {where_clause}
-                    """)
-                    
-                    conn.execute(update_query, params)
+        total_records = 0
+        write_seconds = 0.0
+        persona_counts = pd.Series(dtype='int64')
+        
+        for chunk in stream_query(engine, query, args.fetch_size):
+            chunk = make_predictions(model, chunk)
+            write_seconds += update_database(engine, chunk, table_name, args.write_mode, args.chunk_size)
             
-            conn.commit()
+            total_records += len(chunk)
+            persona_counts = persona_counts.add(chunk['persona'].value_counts(), fill_value=0)
+            logger.info(f"Processed {total_records} records so far")
         
-        logger.info(f"✅ Successfully updated {len(df)} records in {table_name}")
+        return total_records, write_seconds, persona_counts.astype('int64')
         
     except Exception as e:
-        logger.error(f"Failed to update {table_name}: {e}")
+        logger.error(f"Failed to stream predictions for {table_name}: {e}")
         sys.exit(1)
 
 
+def log_summary(table_name, year, month, total_records, write_seconds, write_mode, persona_counts):
+    """Log the prediction summary."""
+    logger.info("=== PREDICTION SUMMARY ===")
+    logger.info(f"Table: {table_name}")
+    logger.info(f"Total records processed: {total_records}")
+    logger.info(f"Date range: {month}/{year}")
+    logger.info(f"Write-back: {total_records / write_seconds:,.0f} rows/sec ({write_seconds:.2f}s, {write_mode} mode)")
+    logger.info(f"Persona distribution:")
+    for persona, count in persona_counts.sort_index().items():
+        logger.info(f"  Persona {persona}: {count} customers")
+
+
 def main():
     """Main execution function."""
     # Parse command line arguments
@@ -262,6 +272,18 @@ def main():
     # Connect to database
     engine = connect_to_database()
     
+    if args.stream:
+        # Bounded-memory path: fetch, predict and write back one chunk at a time
+        total_records, write_seconds, persona_counts = predict_streaming(
+            engine, model, year, month, table_name, args
+        )
+        if total_records == 0:
+            logger.warning(f"No data found for {month}/{year} in {table_name}. Exiting.")
+            return
+        log_summary(table_name, year, month, total_records, write_seconds, args.write_mode, persona_counts)
+        logger.info("Batch prediction completed successfully!")
+        return
+    
     # Query data for specified month/year
     df = query_data_by_month(engine, year, month, table_name)
     
@@ -273,20 +295,22 @@ def main():
     df_with_predictions = make_predictions(model, df)
     
     # Update database
-    update_database(engine, df_with_predictions, table_name)
+    try:
+        write_seconds = update_database(
+            engine, df_with_predictions, table_name, args.write_mode, args.chunk_size
+        )
+    except Exception as e:
+        logger.error(f"Failed to update {table_name}: {e}")
+        sys.exit(1)
     
     # Print summary
-    logger.info("=== PREDICTION SUMMARY ===")
-    logger.info(f"Table: {table_name}")
-    logger.info(f"Total records processed: {len(df)}")
-    logger.info(f"Date range: {month}/{year}")
-    logger.info(f"Persona distribution:")
-    persona_counts = df_with_predictions['persona'].value_counts().sort_index()
-    for persona, count in persona_counts.items():
-        logger.info(f"  Persona {persona}: {count} customers")
+    log_summary(
+        table_name, year, month, len(df), write_seconds, args.write_mode,
+        df_with_predictions['persona'].value_counts()
+    )
     
     logger.info("Batch prediction completed successfully!")
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Measure the overhead of the /predict instrumentation (serving_metrics.py).
+
+Runs the NumPy-only artifact app (gunicorn_predict_artifact) in a fresh process with
+metrics disabled (PREDICT_METRICS=0) and enabled, sends the same small requests through
+Flask's test client - no network, so the per-request cost of the app itself is what is
+compared - and reports the mean time per request of both and the difference. It also
+times track_request() alone.
+
+Usage:
+    python benchmark_metrics.py [--requests 5000] [--rows 4] [--artifact-dir model_artifact]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Runs in the child process, prints microseconds per request as JSON
+RUN = """
+import json, sys, time
+import numpy as np
+import gunicorn_predict_artifact
+from serving_metrics import track_request
+
+requests, rows = int(sys.argv[1]), int(sys.argv[2])
+body = json.dumps((np.random.default_rng(0).normal(size=(rows, 10)) * 5).tolist())
+client = gunicorn_predict_artifact.app.test_client()
+for _ in range(200):  # warm-up
+    client.post("/predict", data=body, content_type="application/json")
+start = time.perf_counter()
+for _ in range(requests):
+    client.post("/predict", data=body, content_type="application/json")
+per_request = (time.perf_counter() - start) / requests
+
+start = time.perf_counter()
+for _ in range(requests):
+    with track_request() as timer:
+        with timer.phase("parse"):
+            pass
+        timer.rows = rows
+        with timer.phase("predict"):
+            pass
+        with timer.phase("serialize"):
+            pass
+per_track = (time.perf_counter() - start) / requests
+print(json.dumps({"request_us": per_request * 1e6, "track_us": per_track * 1e6}))
+"""
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Measure the overhead of the /predict metrics")
+    parser.add_argument('--requests', type=int, default=5000, help='Requests per run')
+    parser.add_argument('--rows', type=int, default=4, help='Rows per request')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per setting, the fastest is reported')
+    parser.add_argument('--artifact-dir', default="model_artifact", help='Artifact directory of the artifact app')
+    return parser.parse_args()
+
+
+def run(enabled, args):
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        env = dict(os.environ, MODEL_ARTIFACT_DIR=args.artifact_dir, PREDICT_METRICS="1" if enabled else "0",
+                   PROMETHEUS_MULTIPROC_DIR=metrics_dir)
+        result = subprocess.run([sys.executable, "-c", RUN, str(args.requests), str(args.rows)],
+                                capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        sys.exit(f"Benchmark run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    args = parse_arguments()
+    off = min((run(False, args) for _ in range(args.repeats)), key=lambda r: r["request_us"])
+    on = min((run(True, args) for _ in range(args.repeats)), key=lambda r: r["request_us"])
+    overhead = on["request_us"] - off["request_us"]
+    print(f"{args.requests} requests of {args.rows} rows through the artifact app (best of {args.repeats}):")
+    print(f"  metrics off: {off['request_us']:8.1f} us/request")
+    print(f"  metrics on:  {on['request_us']:8.1f} us/request")
+    print(f"  overhead:    {overhead:8.1f} us/request ({overhead / off['request_us']:+.1%})")
+    print(f"  track_request() alone: {on['track_us']:.1f} us (disabled: {off['track_us']:.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
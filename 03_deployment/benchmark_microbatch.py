@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark the micro-batching ASGI service against the Flask/gunicorn service.
+
+Both services must be running, e.g.:
+
+    gunicorn --bind=0.0.0.0:9999 --preload --workers 2 --threads 8 gunicorn_predict_registry:app
+    uvicorn asgi_predict_registry:app --port 9998 --workers 2
+
+At every concurrency level, that many clients send small /predict requests back to back
+for --duration seconds over keep-alive connections. Reported are the throughput
+(requests/sec and rows/sec) and the p50/p95/p99 request latency.
+
+Usage:
+    python benchmark_microbatch.py [--concurrency 1 8 32 64] [--rows 4] [--duration 10]
+                                   [--target flask=http://localhost:9999/predict ...]
+"""
+
+import argparse
+import json
+
+from benchmark_predict import encode_request, http_sender, make_features, run_load, summarize
+from payload import PAYLOAD_FORMATS
+
+DEFAULT_TARGETS = ["flask=http://localhost:9999/predict", "asgi=http://localhost:9998/predict"]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark micro-batching against the Flask predict service")
+    parser.add_argument('--target', action='append', dest='targets', metavar='NAME=URL',
+                        help=f'Service to benchmark, repeatable (default: {" ".join(DEFAULT_TARGETS)})')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64],
+                        help='Concurrent clients per run')
+    parser.add_argument('--rows', type=int, default=4, help='Rows per request')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per run')
+    parser.add_argument('--payload', choices=list(PAYLOAD_FORMATS), default="json", help='Request body format')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+    args.targets = [target.split("=", 1) for target in (args.targets or DEFAULT_TARGETS)]
+    return args
+
+
+def run(url, concurrency, args):
+    """One benchmark run at a concurrency level (see benchmark_predict.py)."""
+    # Encoded once, the clients measure the service and not the encoding
+    body, headers = encode_request(make_features(args.rows), args.payload)
+    latencies, errors, elapsed = run_load(http_sender(url), body, headers, concurrency, args.duration)
+    return {"concurrency": concurrency, **summarize(latencies, errors, elapsed, args.rows)}
+
+
+def main():
+    args = parse_arguments()
+    results = {}
+    print(f"{args.rows} rows per request, {args.payload} payload, {args.duration:.0f}s per run")
+    print(f"{'service':>8} {'clients':>8} {'req/s':>9} {'rows/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, url in args.targets:
+        results[name] = []
+        for concurrency in args.concurrency:
+            result = run(url, concurrency, args)
+            results[name].append(result)
+            print(f"{name:>8} {concurrency:>8} {result['requests_per_sec']:>9.1f} {result['rows_per_sec']:>10.1f} "
+                  f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['errors']:>7}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"rows": args.rows, "payload": args.payload, "duration": args.duration, "results": results}, f,
+                      indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Load-testing and latency benchmark harness for the predict service.
+
+Drives /predict with closed-loop clients - every client sends its next request as soon
+as the previous one is answered - for every combination of --batch-sizes (rows per
+request) and --concurrency (clients), and records the throughput (requests/sec and
+rows/sec) and the p50/p95/p99 latency of every run. Targets:
+
+    inprocess  the app module is imported and called through Flask's test client, no
+               network or server in between (default)
+    gunicorn   gunicorn is started with --workers/--threads for the app module
+    url        an already running service, e.g. http://localhost:9999/predict
+
+With --stub (default for the artifact app) the model is a synthetic centroid artifact
+written to a temporary directory, so the harness runs without MLflow, GCS or a trained
+model. The report (--output) is JSON with the git commit, host and configuration next
+to the results; --compare prints the change against an earlier report.
+
+Usage:
+    python benchmark_predict.py [--target inprocess|gunicorn|url] [--app gunicorn_predict_artifact]
+                                [--batch-sizes 1 100 1000] [--concurrency 1 8] [--duration 5]
+                                [--workers 2 --threads 1] [--output report.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from model_artifact import write_artifact
+from payload import FEATURE_COLUMNS, PAYLOAD_FORMATS, request_kwargs
+
+TARGETS = ["inprocess", "gunicorn", "url"]
+STUB_CLUSTERS = 4
+WARMUP_REQUESTS = 20
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Load-test the predict service")
+    parser.add_argument('--target', choices=TARGETS, default="inprocess", help='How the app is driven')
+    parser.add_argument('--app', default="gunicorn_predict_artifact",
+                        help='App module for the inprocess and gunicorn targets')
+    parser.add_argument('--url', default="http://localhost:9999/predict", help='Endpoint for the url target')
+    parser.add_argument('--stub', action=argparse.BooleanOptionalAction, default=None,
+                        help='Serve a synthetic centroid artifact (default: on for the artifact app)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 1000], help='Rows per request')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8], help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds per run')
+    parser.add_argument('--payload', choices=list(PAYLOAD_FORMATS), default="json", help='Request body format')
+    parser.add_argument('--workers', type=int, default=2, help='Gunicorn workers (gunicorn target)')
+    parser.add_argument('--threads', type=int, default=1, help='Gunicorn threads per worker (gunicorn target)')
+    parser.add_argument('--port', type=int, default=9991, help='Port for the gunicorn target')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    parser.add_argument('--compare', help='Earlier report to compare the results with')
+    args = parser.parse_args()
+    if args.stub is None:
+        args.stub = args.app == "gunicorn_predict_artifact" and args.target != "url"
+    return args
+
+
+def make_features(rows, seed=0):
+    """Synthetic feature frame with the spread of the generated customer data."""
+    values = np.random.default_rng(seed).normal(size=(rows, len(FEATURE_COLUMNS))) * 5
+    return pd.DataFrame(values, columns=FEATURE_COLUMNS)
+
+
+def write_stub_artifact(directory, n_clusters=STUB_CLUSTERS, seed=0):
+    """Write a centroid artifact with random centers for gunicorn_predict_artifact."""
+    centers = np.random.default_rng(seed).normal(size=(n_clusters, len(FEATURE_COLUMNS))) * 5
+    write_artifact(directory, centers, FEATURE_COLUMNS, "stub_model", "0")
+
+
+def encode_request(features, payload_format):
+    """Return (body, headers) of a /predict request, encoded once per run."""
+    kwargs = request_kwargs(features, payload_format)
+    if "json" in kwargs:
+        # Encoded here, Flask's test client would sort the record keys
+        return json.dumps(kwargs["json"]).encode(), {"Content-Type": "application/json"}
+    return kwargs["data"], kwargs["headers"]
+
+
+def http_sender(url):
+    """Return a factory of per-client send(body, headers) functions posting to url."""
+    def factory():
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+        def send(body, headers):
+            return session.post(url, data=body, headers=headers, timeout=60).status_code
+        return send
+    return factory
+
+
+def inprocess_sender(app, path="/predict"):
+    """Return a factory of per-client send(body, headers) functions calling the Flask app."""
+    def factory():
+        client = app.test_client()
+
+        def send(body, headers):
+            return client.post(path, data=body, headers=headers).status_code
+        return send
+    return factory
+
+
+def run_load(sender_factory, body, headers, concurrency, duration):
+    """
+    Run concurrency closed-loop clients for duration seconds.
+    Returns (latencies in seconds of the successful requests, errors, elapsed seconds).
+    """
+    latencies, lock = [], threading.Lock()
+
+    def client(stop_at):
+        send, own, errors = sender_factory(), [], 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                ok = send(body, headers) == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                own.append(time.perf_counter() - start)
+            else:
+                errors += 1
+        with lock:
+            latencies.extend(own)
+        return errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        errors = sum(executor.map(client, [start + duration] * concurrency))
+    return latencies, errors, time.perf_counter() - start
+
+
+def summarize(latencies, errors, elapsed, rows):
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [float("nan")] * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "rows_per_sec": round(len(latencies) * rows / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else float("nan"),
+        "p50_ms": round(quantiles[49] * 1000, 3),
+        "p95_ms": round(quantiles[94] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3),
+    }
+
+
+def start_gunicorn(args, env):
+    """Start gunicorn for args.app and wait until /predict answers. Returns (process, url)."""
+    url = f"http://127.0.0.1:{args.port}/predict"
+    server = subprocess.Popen(
+        ["gunicorn", f"--bind=127.0.0.1:{args.port}", "--preload", f"--workers={args.workers}",
+         f"--threads={args.threads}", f"{args.app}:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    body, headers = encode_request(make_features(1), "json")
+    deadline = time.monotonic() + 120
+    while True:
+        try:
+            if requests.post(url, data=body, headers=headers, timeout=5).status_code == 200:
+                return server, url
+        except requests.RequestException:
+            pass
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            sys.exit(f"gunicorn did not start {args.app}")
+        time.sleep(0.5)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Print the change of throughput and p95 latency against an earlier report."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["batch_size"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}, {baseline['config']['target']}):")
+    print(f"{'rows':>6} {'clients':>8} {'req/s':>18} {'p95 ms':>20}")
+    for result in results:
+        before = previous.get((result["batch_size"], result["concurrency"]))
+        if before is None:
+            continue
+        throughput = result["requests_per_sec"] / before["requests_per_sec"] - 1 if before["requests_per_sec"] else float("nan")
+        p95 = result["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else float("nan")
+        print(f"{result['batch_size']:>6} {result['concurrency']:>8} "
+              f"{before['requests_per_sec']:>8.1f} {throughput:>+8.1%} {before['p95_ms']:>9.2f} {p95:>+9.1%}")
+
+
+def main():
+    args = parse_arguments()
+    env = dict(os.environ)
+    stub_dir = tempfile.TemporaryDirectory() if args.stub else None
+    if stub_dir is not None:
+        write_stub_artifact(stub_dir.name)
+        # Read by gunicorn_predict_artifact at import, in this process or in gunicorn
+        env["MODEL_ARTIFACT_DIR"] = os.environ["MODEL_ARTIFACT_DIR"] = stub_dir.name
+
+    server = None
+    if args.target == "inprocess":
+        import importlib
+
+        sender_factory = inprocess_sender(importlib.import_module(args.app).app)
+    elif args.target == "gunicorn":
+        server, url = start_gunicorn(args, env)
+        sender_factory = http_sender(url)
+    else:
+        sender_factory = http_sender(args.url)
+
+    results = []
+    try:
+        print(f"Target {args.target} ({args.url if args.target == 'url' else args.app}), {args.payload} payload, "
+              f"{args.duration:.0f}s per run")
+        print(f"{'rows':>6} {'clients':>8} {'req/s':>9} {'rows/s':>11} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for batch_size in args.batch_sizes:
+            body, headers = encode_request(make_features(batch_size), args.payload)
+            send = sender_factory()
+            for _ in range(WARMUP_REQUESTS):
+                send(body, headers)
+            for concurrency in args.concurrency:
+                result = summarize(*run_load(sender_factory, body, headers, concurrency, args.duration), batch_size)
+                result = {"batch_size": batch_size, "concurrency": concurrency, **result}
+                results.append(result)
+                print(f"{batch_size:>6} {concurrency:>8} {result['requests_per_sec']:>9.1f} {result['rows_per_sec']:>11.1f} "
+                      f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['errors']:>7}")
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+        if stub_dir is not None:
+            stub_dir.cleanup()
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": {
+            "target": args.target,
+            "app": args.url if args.target == "url" else args.app,
+            "stub": args.stub,
+            "payload": args.payload,
+            "duration": args.duration,
+            "workers": args.workers if args.target == "gunicorn" else None,
+            "threads": args.threads if args.target == "gunicorn" else None,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
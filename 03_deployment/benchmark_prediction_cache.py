@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark the prediction cache (prediction_cache.py) against uncached predictions.
+
+Requests are drawn from a pool of --distinct customer vectors, so rows repeat within and
+across requests like in production traffic. For the NumPy nearest-centroid kernel and
+the pyfunc backend (a KMeans fitted on synthetic data, predicting from a DataFrame like
+the MLflow pyfunc wrapper), the script reports the mean time per request with and
+without the cache, the cache hit rate and the share of duplicate rows.
+
+Usage:
+    python benchmark_prediction_cache.py [--rows 1 10 100 1000] [--distinct 10000] [--requests 2000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+
+from centroid_model import FEATURE_COLUMNS, CentroidModel, PyfuncPredictor
+from prediction_cache import PredictionCache
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the prediction cache")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 10, 100, 1000], help='Rows per request')
+    parser.add_argument('--distinct', type=int, default=10_000, help='Distinct customer vectors in the traffic')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per measurement')
+    parser.add_argument('--cache-size', type=int, default=100_000, help='Cache entries')
+    return parser.parse_args()
+
+
+def per_request_us(predict, requests):
+    start = time.perf_counter()
+    for X in requests:
+        predict(X)
+    return (time.perf_counter() - start) / len(requests) * 1e6
+
+
+def main():
+    args = parse_arguments()
+    rng = np.random.default_rng(0)
+    pool = rng.normal(size=(args.distinct, len(FEATURE_COLUMNS))) * 5
+    kmeans = KMeans(4, n_init=1, random_state=0).fit(pd.DataFrame(pool, columns=FEATURE_COLUMNS))
+    backends = {"numpy": CentroidModel.from_model(kmeans), "pyfunc": PyfuncPredictor(kmeans)}
+
+    print(f"{args.distinct} distinct vectors, {args.requests} requests per measurement, mean time per request:")
+    print(f"{'backend':>8} {'rows':>6} {'uncached':>12} {'cached':>12} {'speedup':>8} {'hit rate':>9} {'duplicates':>11}")
+    for rows in args.rows:
+        warmup = [pool[rng.integers(0, args.distinct, rows)] for _ in range(args.requests)]
+        requests = [pool[rng.integers(0, args.distinct, rows)] for _ in range(args.requests)]
+        for name, predictor in backends.items():
+            cache = PredictionCache(args.cache_size, version="1")
+            for X in warmup:  # earlier traffic from the same customers
+                cache.predict("1", predictor, X)
+            warm_hits, warm_misses, warm_duplicates = cache.hits, cache.misses, cache.duplicates
+            uncached = per_request_us(predictor.predict, requests)
+            cached = per_request_us(lambda X: cache.predict("1", predictor, X), requests)
+            hits, misses = cache.hits - warm_hits, cache.misses - warm_misses
+            duplicates = (cache.duplicates - warm_duplicates) / (rows * args.requests)
+            for X in requests[:50]:
+                assert (cache.predict("1", predictor, X)[0] == predictor.predict(X)).all()
+            print(f"{name:>8} {rows:>6} {uncached:>9.1f} us {cached:>9.1f} us {uncached / cached:>7.1f}x "
+                  f"{hits / max(hits + misses, 1):>9.1%} {duplicates:>11.1%}")
+
+
+if __name__ == "__main__":
+    main()
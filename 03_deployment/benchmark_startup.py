@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cold start of the serving modes.
+
+Every run starts a fresh Python process that imports the app module (which loads the
+model at import time, as under gunicorn --preload) and measures the time until the app
+is ready and the peak RSS of the process. Modes:
+
+    artifact  gunicorn_predict_artifact: centroids.npy + metadata.json, NumPy only
+    pickle    sklearn model unpickled from a local model.pkl, the model loading of the
+              GCS app without the download
+    pyfunc    MLflow pyfunc model loaded from a local path, the model loading of the
+              registry app without the network round-trips
+    registry  gunicorn_predict_registry: resolves Production from the MLflow server
+
+Usage:
+    python benchmark_startup.py [--modes artifact pickle pyfunc] [--repeats 5]
+                                [--artifact-dir model_artifact] [--model-path ../01_model/dtc_persona_clustering_model_v1/model]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODES = ["artifact", "pickle", "pyfunc", "registry"]
+
+# Reports peak RSS and which heavy libraries ended up imported
+REPORT = (
+    "import json, resource, sys;"
+    "print(json.dumps({'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,"
+    " 'imports': [m for m in ('mlflow', 'sklearn', 'pandas', 'google.cloud.storage') if m in sys.modules]}))"
+)
+
+SNIPPETS = {
+    "artifact": "import gunicorn_predict_artifact",
+    "pickle": (
+        "import flask, pickle;"
+        "from centroid_model import build_predictor;"
+        "build_predictor(pickle.load(open({model_path!r} + '/model.pkl', 'rb')))"
+    ),
+    "pyfunc": (
+        "import flask, mlflow.pyfunc;"
+        "from centroid_model import build_predictor;"
+        "build_predictor(mlflow.pyfunc.load_model({model_path!r}))"
+    ),
+    "registry": "import gunicorn_predict_registry",
+}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the serving modes")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=["artifact", "pickle", "pyfunc"])
+    parser.add_argument('--repeats', type=int, default=5, help='Fresh processes started per mode')
+    parser.add_argument('--artifact-dir', default="model_artifact", help='Artifact directory for the artifact mode')
+    parser.add_argument('--model-path', default="../01_model/dtc_persona_clustering_model_v1/model",
+                        help='Local MLflow model for the pickle and pyfunc modes')
+    return parser.parse_args()
+
+
+def start_once(mode, args):
+    """Start one process for mode. Returns (seconds, report)."""
+    code = SNIPPETS[mode].format(model_path=args.model_path) + "\n" + REPORT
+    env = dict(os.environ, MODEL_ARTIFACT_DIR=args.artifact_dir)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env)
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{mode} failed to start:\n{result.stderr[-2000:]}")
+    return seconds, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    args = parse_arguments()
+    print(f"Starting each mode {args.repeats} times (median of cold process starts):")
+    for mode in args.modes:
+        try:
+            runs = [start_once(mode, args) for _ in range(args.repeats)]
+        except RuntimeError as e:
+            print(f"{mode:>9}: {e}")
+            continue
+        seconds = statistics.median(run[0] for run in runs)
+        rss_mb = statistics.median(run[1]["rss_mb"] for run in runs)
+        imports = ", ".join(runs[0][1]["imports"]) or "-"
+        print(f"{mode:>9}: ready in {seconds:.2f}s, peak RSS {rss_mb:.0f} MB, imports: {imports}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Measure the private memory of preforked workers (Linux only).
+
+With gunicorn --preload the workers share the master's memory pages copy-on-write, but a
+page is copied into a worker as soon as the worker writes to it - and a full garbage
+collection writes to the header of every tracked object, i.e. to nearly every page of
+the unpickled model and the imported libraries. The memory really added per worker is
+its private memory (USS), not its RSS.
+
+For every app and setting, a fresh process does what gunicorn.conf.py does around
+--preload: it imports the app module, optionally freezes its objects, and forks
+--workers workers. Every worker serves --requests requests through the Flask test
+client, then runs a full collection, as a long-running worker eventually does, and
+reports /proc/self/smaps_rollup. Settings:
+
+    baseline  GC_FREEZE=0 MODEL_MMAP=0: copy-on-write only
+    shared    GC_FREEZE=1 MODEL_MMAP=1: app objects frozen before the fork, centroids
+              memory-mapped read-only (artifact app)
+
+Usage:
+    python benchmark_worker_memory.py [--apps gunicorn_predict_artifact gunicorn_predict_registry]
+                                      [--workers 4] [--requests 200]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SETTINGS = {
+    "baseline": {"GC_FREEZE": "0", "MODEL_MMAP": "0"},
+    "shared": {"GC_FREEZE": "1", "MODEL_MMAP": "1"},
+}
+
+# Runs in a fresh process: argv = app module, workers, requests. Prints JSON.
+RUN = """
+import gc, importlib, json, os, sys
+
+def memory(pid="self"):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": values["Rss"],
+            "private": values["Private_Clean"] + values["Private_Dirty"]}
+
+module, workers, requests = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+freeze = os.environ["GC_FREEZE"] != "0"
+if freeze:
+    gc.disable()
+app = importlib.import_module(module).app
+if freeze:
+    gc.freeze()
+gc.enable()
+
+body = json.dumps([[1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0], [0.0] * 10])
+pipes = []
+for _ in range(workers):
+    read_end, write_end = os.pipe()
+    if os.fork() == 0:
+        client = app.test_client()
+        for _ in range(requests):
+            assert client.post("/predict", data=body, content_type="application/json").status_code == 200
+        gc.collect()
+        os.write(write_end, json.dumps(memory()).encode())
+        os._exit(0)
+    pipes.append(read_end)
+results = [json.loads(os.read(read_end, 4096)) for read_end in pipes]
+for _ in range(workers):
+    os.wait()
+print(json.dumps({"workers": results, "master": memory()}))
+"""
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Measure the private memory of preforked workers")
+    parser.add_argument('--apps', nargs='+', default=["gunicorn_predict_artifact", "gunicorn_predict_registry"],
+                        help='App modules, imported like gunicorn --preload does')
+    parser.add_argument('--settings', nargs='+', choices=list(SETTINGS), default=list(SETTINGS))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='Requests served by every worker')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    return parser.parse_args()
+
+
+def measure(app, setting, args):
+    env = dict(os.environ, **SETTINGS[setting])
+    result = subprocess.run([sys.executable, "-c", RUN, app, str(args.workers), str(args.requests)],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"failed:\n{result.stderr[-2000:]}")
+    memory = json.loads(result.stdout.strip().splitlines()[-1])
+    workers = memory["workers"]
+    return {
+        "app": app,
+        "setting": setting,
+        "workers": len(workers),
+        "worker_private_mb": round(sum(w["private"] for w in workers) / len(workers), 1),
+        "worker_rss_mb": round(sum(w["rss"] for w in workers) / len(workers), 1),
+        "master_rss_mb": round(memory["master"]["rss"], 1),
+    }
+
+
+def main():
+    args = parse_arguments()
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("/proc/<pid>/smaps_rollup is needed (Linux 4.14+)")
+    results = []
+    print(f"{args.workers} workers, {args.requests} requests each, then a full garbage collection:")
+    print(f"{'app':>26} {'setting':>9} {'private/worker':>15} {'rss/worker':>11} {'master rss':>11}")
+    for app in args.apps:
+        for setting in args.settings:
+            try:
+                result = measure(app, setting, args)
+            except RuntimeError as e:
+                print(f"{app:>26} {setting:>9} {e}")
+                continue
+            results.append(result)
+            print(f"{app:>26} {setting:>9} {result['worker_private_mb']:>12.1f} MB {result['worker_rss_mb']:>8.1f} MB "
+                  f"{result['master_rss_mb']:>8.1f} MB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+NumPy nearest-centroid predictor for the serving apps.
+
+KMeans.predict assigns every row to its nearest cluster center. For 10 features and a
+handful of clusters that is a tiny matrix product, but through the MLflow pyfunc
+wrapper each call also pays for DataFrame construction, schema enforcement and
+sklearn input validation. CentroidModel extracts cluster_centers_ once at load time
+and assigns labels with a vectorized NumPy kernel on the contiguous request array.
+
+The backend is chosen with the PREDICT_BACKEND environment variable:
+
+    numpy   nearest-centroid kernel (default), verified against model.predict at startup
+    pyfunc  the loaded model's own predict()
+
+If the centroids cannot be extracted or the parity check fails, the apps fall back to
+the pyfunc path.
+"""
+
+import logging
+import os
+
+import numpy as np
+
+FEATURE_COLUMNS = ["x1", "x2", "x3", "x4", "x5", "x6", "x7", "x8", "x9", "x10"]
+
+# Rows sampled around the centroids for the startup parity check
+PARITY_SAMPLES = 10_000
+
+
+class CentroidModel:
+    """Nearest-centroid label assignment with NumPy."""
+
+    def __init__(self, centers):
+        # No copy for C-contiguous float64 centers, a read-only memory map stays shared
+        self.centers = np.ascontiguousarray(centers, dtype=np.float64)
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2, and ||x||^2 does not change the argmin
+        self.half_sq_norms = 0.5 * np.einsum("ij,ij->i", self.centers, self.centers)
+
+    @classmethod
+    def from_centers(cls, centers, feature_names=None):
+        """Build the predictor from centers whose columns follow feature_names."""
+        centers = np.asarray(centers)
+        # Reorder the centroid columns to the x1..x10 order of the request arrays
+        if feature_names is not None:
+            order = [list(feature_names).index(col) for col in FEATURE_COLUMNS]
+            if order != list(range(centers.shape[1])):
+                centers = centers[:, order]
+        return cls(centers)
+
+    @classmethod
+    def from_model(cls, model):
+        """Build the predictor from a fitted KMeans, bare or wrapped in an MLflow pyfunc model."""
+        estimator = unwrap_estimator(model)
+        return cls.from_centers(estimator.cluster_centers_, getattr(estimator, "feature_names_in_", None))
+
+    def predict(self, X):
+        """Return the index of the nearest center for every row of the (n, 10) array X."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        scores = X @ self.centers.T - self.half_sq_norms
+        return scores.argmax(axis=1).astype(np.int32)
+
+
+class PyfuncPredictor:
+    """Predict with the loaded model itself, fed with a DataFrame of named features."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, X):
+        # pandas is only needed on this path, the artifact server never imports it
+        import pandas as pd
+
+        return np.asarray(self.model.predict(pd.DataFrame(X, columns=FEATURE_COLUMNS)))
+
+
+def unwrap_estimator(model):
+    """Return the sklearn estimator behind an MLflow pyfunc model (or the model itself)."""
+    if hasattr(model, "cluster_centers_"):
+        return model
+    if hasattr(model, "get_raw_model"):
+        return model.get_raw_model()
+    # Older MLflow versions: the sklearn flavor wrapper keeps the estimator as sklearn_model
+    return model._model_impl.sklearn_model
+
+
+def parity_sample(centers, n=PARITY_SAMPLES, seed=0):
+    """Sample points around and between the centroids, where label boundaries are."""
+    rng = np.random.default_rng(seed)
+    spread = centers.std(axis=0).mean() or 1.0
+    anchors = centers[rng.integers(len(centers), size=n)]
+    return anchors + rng.normal(scale=spread, size=anchors.shape)
+
+
+def check_parity(centroid_model, model):
+    """Return the fraction of sampled rows on which the kernel and model.predict disagree."""
+    X = parity_sample(centroid_model.centers)
+    expected = PyfuncPredictor(model).predict(X)
+    return float(np.mean(centroid_model.predict(X) != expected))
+
+
+def build_predictor(model, backend=None):
+    """
+    Return the predictor serving /predict for the loaded model.
+
+    backend defaults to the PREDICT_BACKEND environment variable ('numpy' or 'pyfunc').
+    The numpy backend is only used if it agrees with model.predict on every sampled row.
+    """
+    backend = backend or os.getenv("PREDICT_BACKEND", "numpy")
+    if backend == "pyfunc":
+        logging.info("Serving predictions through the model's predict() (PREDICT_BACKEND=pyfunc)")
+        return PyfuncPredictor(model)
+    try:
+        centroid_model = CentroidModel.from_model(model)
+        mismatch = check_parity(centroid_model, model)
+    except Exception as e:
+        logging.warning(f"NumPy backend unavailable ({e}), falling back to the model's predict()")
+        return PyfuncPredictor(model)
+    if mismatch > 0:
+        logging.warning(f"NumPy backend disagrees with model.predict on {mismatch:.2%} of the "
+                        f"parity sample, falling back to the model's predict()")
+        return PyfuncPredictor(model)
+    logging.info(f"Serving predictions with the NumPy nearest-centroid kernel "
+                 f"({len(centroid_model.centers)} centers, parity check passed)")
+    return centroid_model
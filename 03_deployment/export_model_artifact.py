@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Export the minimal serving artifact (see model_artifact.py) of an MLflow model.
+
+Loads the model (by default the Production version from the registry), writes
+centroids.npy and metadata.json to the output directory and, for registered models,
+logs the directory to the model's run under 'centroid_artifact', alongside the MLflow model.
+
+Usage:
+    python export_model_artifact.py [--model-uri models:/dtc_persona_clustering_model/Production]
+                                    [--tracking-uri http://localhost:5050] [--output-dir model_artifact]
+
+Examples:
+    python export_model_artifact.py                                                  # Production version
+    python export_model_artifact.py --model-uri models:/dtc_persona_clustering_model/7
+    python export_model_artifact.py --model-uri ../01_model/dtc_persona_clustering_model_v1/model
+"""
+
+import argparse
+import logging
+import sys
+
+import mlflow
+from mlflow.tracking import MlflowClient
+
+from centroid_model import CentroidModel, check_parity, unwrap_estimator
+from model_artifact import write_artifact
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "dtc_persona_clustering_model"
+ARTIFACT_PATH = "centroid_artifact"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Export the minimal centroid serving artifact of an MLflow model")
+    parser.add_argument('--model-uri', default=f"models:/{MODEL_NAME}/Production",
+                        help=f'MLflow model URI or local model path (default: models:/{MODEL_NAME}/Production)')
+    parser.add_argument('--tracking-uri', default="http://localhost:5050", help='MLflow tracking server')
+    parser.add_argument('--output-dir', default="model_artifact", help='Directory to write the artifact to')
+    parser.add_argument('--no-log', action='store_true', help='Do not log the artifact to the model run')
+    return parser.parse_args()
+
+
+def resolve_version(client, model_uri):
+    """Return the registry ModelVersion of a models:/<name>/<stage|version> URI, None otherwise."""
+    if not model_uri.startswith("models:/"):
+        return None
+    name, stage_or_version = model_uri[len("models:/"):].split("/", 1)
+    if stage_or_version.isdigit():
+        return client.get_model_version(name, stage_or_version)
+    return client.get_latest_versions(name, stages=[stage_or_version])[0]
+
+
+def main():
+    args = parse_arguments()
+    mlflow.set_tracking_uri(args.tracking_uri)
+    client = MlflowClient()
+    try:
+        version = resolve_version(client, args.model_uri)
+        logger.info(f"Loading model from {args.model_uri}...")
+        model = mlflow.pyfunc.load_model(args.model_uri)
+    except Exception as e:
+        logger.error(f"Failed to load the model: {e}")
+        sys.exit(1)
+
+    estimator = unwrap_estimator(model)
+    feature_names = list(getattr(estimator, "feature_names_in_", [f"x{i}" for i in range(1, 11)]))
+    mismatch = check_parity(CentroidModel.from_centers(estimator.cluster_centers_, feature_names), model)
+    if mismatch > 0:
+        logger.error(f"Centroid predictions disagree with the model on {mismatch:.2%} of the parity sample")
+        sys.exit(1)
+
+    metadata = write_artifact(
+        args.output_dir,
+        estimator.cluster_centers_,
+        feature_names,
+        model_name=version.name if version else MODEL_NAME,
+        model_version=version.version if version else "local",
+        run_id=version.run_id if version else None,
+        model_uri=args.model_uri,
+    )
+    logger.info(f"✅ Artifact of version {metadata['model_version']} written to {args.output_dir} "
+                f"({metadata['n_clusters']} centroids, sha256 {metadata['centroids_sha256'][:12]})")
+
+    if version and not args.no_log:
+        client.log_artifacts(version.run_id, args.output_dir, artifact_path=ARTIFACT_PATH)
+        logger.info(f"Logged the artifact to run {version.run_id} under '{ARTIFACT_PATH}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Gunicorn settings, read from the working directory when gunicorn starts.
+
+Prepares the prometheus_client multiprocess directory shared by all workers for the
+/metrics endpoint (see serving_metrics.py). Runs in the master before the app is loaded.
+
+With --preload, the objects of the loaded app are frozen before the workers are forked
+(GC_FREEZE=0 to disable): the garbage collector of a worker then never traverses them,
+so their memory pages are not written to and stay shared with the master instead of
+being copied into every worker. As recommended for gc.freeze(), the collector is off
+in the master while the app loads and switched back on right before the fork.
+
+Every worker warms up its app with synthetic requests before it accepts connections
+(see warmup.py).
+"""
+
+import gc
+import glob
+import os
+import tempfile
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "predict_metrics"))
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+# Values left by a previous server would be added to the new ones
+for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+    os.remove(path)
+
+GC_FREEZE = os.getenv("GC_FREEZE", "1") != "0"
+if GC_FREEZE:
+    # Collections while loading would leave freed holes in the pages shared after the fork
+    gc.disable()
+
+
+def when_ready(server):
+    # Runs in the master after the app was preloaded, right before the workers are forked
+    if GC_FREEZE and server.cfg.preload_app:
+        gc.freeze()
+        server.log.info(f"Froze {gc.get_freeze_count()} objects of the preloaded app")
+    gc.enable()
+
+
+def post_fork(server, worker):
+    from serving_metrics import worker_started
+
+    worker_started()
+
+
+def post_worker_init(worker):
+    # Runs in the worker after the app is loaded, before it accepts connections
+    from warmup import warm_up_worker
+
+    warm_up_worker(worker.wsgi)
+
+
+def child_exit(server, worker):
+    from serving_metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
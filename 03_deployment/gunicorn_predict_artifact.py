@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import logging
+from flask import Flask, Response, request, jsonify, stream_with_context
+
+from centroid_model import CentroidModel
+from model_artifact import load_artifact
+from prediction_cache import build_cache, cached_predict
+from payload import (
+    JSON_MIMETYPE,
+    NDJSON_MIMETYPE,
+    NPY_MIMETYPE,
+    PayloadError,
+    decode_array,
+    encode_labels,
+    records_to_array,
+    stream_predictions,
+)
+from serving_metrics import metrics_response, record_model, track_request, track_stream
+from warmup import flask_sender, install, is_warmup
+
+# Configure logging for Gunicorn
+logging.basicConfig(level=logging.INFO)
+
+# Directory written by export_model_artifact.py
+MODEL_ARTIFACT_DIR = os.getenv("MODEL_ARTIFACT_DIR", "model_artifact")
+# Memory-map centroids.npy read-only, all workers share its pages (0: private copy per process)
+MODEL_MMAP = os.getenv("MODEL_MMAP", "1") != "0"
+
+# Global model variables
+model = None
+model_metadata = None
+# Optional LRU cache of predicted labels (PREDICTION_CACHE_SIZE, see prediction_cache.py)
+prediction_cache = None
+# Warm-up state of this worker, run before it accepts connections (see warmup.py)
+warmup = None
+
+def load_model():
+    """
+    Load the centroid artifact (centroids.npy + metadata.json) with NumPy only and assign
+    to the global 'model' variable. No mlflow, sklearn or GCS client is imported.
+    Exits the process if loading fails.
+    """
+    global model, model_metadata
+    try:
+        logging.info(f"Loading model artifact from '{MODEL_ARTIFACT_DIR}'...")
+        start = time.perf_counter()
+        centers, model_metadata = load_artifact(MODEL_ARTIFACT_DIR, mmap=MODEL_MMAP)
+        model = CentroidModel.from_centers(centers, model_metadata["feature_names"])
+        record_model(model_metadata["model_version"], time.perf_counter() - start)
+    except Exception as e:
+        logging.error(f"Failed to load the model artifact: {e}")
+        logging.error("Export it first with 'python export_model_artifact.py' or set MODEL_ARTIFACT_DIR.")
+        sys.exit(1)
+    else:
+        logging.info(f"Model '{model_metadata['model_name']}' version {model_metadata['model_version']} "
+                     f"loaded successfully ({model_metadata['n_clusters']} centroids)")
+
+
+app = Flask("label_predictor")
+
+# Load model at startup (for Gunicorn --preload efficiency)
+load_model()
+prediction_cache = build_cache(model_metadata["model_version"])
+warmup = install(app)
+
+
+@app.route("/predict", methods=["POST"])
+def predict_labels():
+    """
+    Predict persona labels for input features.
+    Expects a JSON array of feature dicts, or a binary body (.npy / Arrow IPC, see payload.py).
+    Returns: JSON with predicted labels, or a packed int32 .npy array if requested via Accept.
+    """
+    # Warm-up requests (see warmup.py) are not recorded and bypass the prediction cache
+    warming = is_warmup(request.environ)
+    with track_request(record=not warming) as timer:
+        try:
+            with timer.phase("parse"):
+                if request.mimetype == JSON_MIMETYPE:
+                    features = records_to_array(request.get_json())
+                else:
+                    features = decode_array(request.get_data(), request.mimetype)
+        except PayloadError as e:
+            timer.outcome = "client_error"
+            return jsonify({"error": str(e)}), e.status
+        timer.rows = len(features)
+        with timer.phase("predict"):
+            predictions_nparray = cached_predict(None if warming else prediction_cache,
+                                                 model_metadata["model_version"], model, features)
+        with timer.phase("serialize"):
+            if request.accept_mimetypes.best_match([JSON_MIMETYPE, NPY_MIMETYPE]) == NPY_MIMETYPE:
+                return Response(encode_labels(predictions_nparray), mimetype=NPY_MIMETYPE)
+            result = {"labels": predictions_nparray.tolist()}
+            return jsonify(result)
+
+
+@app.route("/predict/stream", methods=["POST"])
+def predict_labels_stream():
+    """
+    Predict persona labels for a newline-delimited JSON body of feature records, read and
+    predicted in blocks of STREAM_BLOCK_ROWS rows (see payload.py).
+    Returns: one JSON line {"labels": [...]} per block, streamed while the body is read.
+    """
+    if request.mimetype != NDJSON_MIMETYPE:
+        return jsonify({"error": f"Expected Content-Type '{NDJSON_MIMETYPE}'"}), 415
+    return Response(stream_with_context(track_stream(
+        lambda timer: stream_predictions(request.stream, model.predict, timer=timer))),
+                    mimetype=NDJSON_MIMETYPE)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics aggregated over all workers (see serving_metrics.py)."""
+    body, content_type = metrics_response()
+    return Response(body, headers={"Content-Type": content_type})
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: the worker process is running."""
+    return jsonify({"status": "ok"})
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: 200 once this worker is warmed up (see warmup.py), 503 before."""
+    if warmup.state == "cold":
+        # Not started by gunicorn.conf.py, e.g. under flask run
+        warmup.run(flask_sender(app))
+    return jsonify(warmup.status()), 200 if warmup.ready else 503
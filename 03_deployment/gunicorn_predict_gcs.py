@@ -1,10 +1,25 @@
-import pandas as pd
 from google.cloud import storage
 import pickle
-import io
 import os
+import time
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+
+from centroid_model import build_predictor
+from model_cache import gcs_blob_path
+from prediction_cache import build_cache, cached_predict
+from payload import (
+    JSON_MIMETYPE,
+    NDJSON_MIMETYPE,
+    NPY_MIMETYPE,
+    PayloadError,
+    decode_array,
+    encode_labels,
+    records_to_array,
+    stream_predictions,
+)
+from serving_metrics import metrics_response, record_model, track_request, track_stream
+from warmup import flask_sender, install, is_warmup
 
 # Configure logging so messages are visible in your gunicorn.log file
 logging.basicConfig(level=logging.INFO)
@@ -12,29 +27,45 @@ logging.basicConfig(level=logging.INFO)
 # --- Global model variable ---
 # Define a variable in the global scope that will hold our model.
 model = None
+# The predictor serving /predict: a NumPy nearest-centroid kernel built from the
+# model's cluster centers, or the model itself (PREDICT_BACKEND, see centroid_model.py)
+predictor = None
+# The GCS blob generation of the loaded model, and the optional LRU cache of predicted
+# labels (PREDICTION_CACHE_SIZE, see prediction_cache.py)
+model_version = None
+prediction_cache = None
+# Warm-up state of this worker, run before it accepts connections (see warmup.py).
+# Without a model the warm-up requests fail and the worker never reports ready.
+warmup = None
 
 
 def load_model():
     """
     Loads the model from GCS and populates the global 'model' variable.
     This function will be called once when the script is loaded.
+    The pickle is only downloaded if the local model cache has no current copy (see model_cache.py).
     """
-    global model
+    global model, model_version
     try:
         project_id = "tough-processor-312510"
         bucket_name = "mmotl_mlflow_artifacts"
         blob_path = "5/ba49d88bf2224b13a4643ac0104f12ad/artifacts/model/model.pkl"
 
+        start = time.perf_counter()
         logging.info("Initializing GCS client...")
         storage_client = storage.Client(project=project_id)
 
-        logging.info(f"Downloading model from gs://{bucket_name}/{blob_path}")
+        logging.info(f"Fetching model from gs://{bucket_name}/{blob_path}")
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.blob(blob_path)
-        model_bytes = blob.download_as_bytes()
+        model_dir = gcs_blob_path(blob)
 
         logging.info("Loading model using pickle...")
-        model = pickle.load(io.BytesIO(model_bytes))
+        with open(os.path.join(model_dir, os.path.basename(blob_path)), "rb") as f:
+            model = pickle.load(f)
+        # The blob generation identifies the served model version
+        model_version = blob.generation
+        record_model(model_version, time.perf_counter() - start)
         logging.info("✅ Model loaded successfully and is ready.")
 
     except Exception as e:
@@ -52,15 +83,20 @@ app = Flask("label_predictor")
 # the master process. The loaded 'model' variable is then inherited by all the
 # worker processes, which is highly efficient.
 load_model()
+if model is not None:
+    predictor = build_predictor(model)
+    prediction_cache = build_cache(model_version)
+warmup = install(app)
 
 
 @app.route("/predict", methods=["POST"])
 def predict_labels():
     """
     Handles prediction requests.
+    Accepts a JSON array of feature dicts, or a binary body (.npy / Arrow IPC, see payload.py).
     """
     # A check to ensure the model was loaded correctly during startup.
-    if model is None:
+    if predictor is None:
         return (
             jsonify(
                 {"error": "Model is not available. Check server logs for details."}
@@ -68,16 +104,72 @@ def predict_labels():
             500,
         )
 
-    json_data = request.get_json()
-    features = pd.DataFrame(json_data)
-
-    feature_names = ["x1", "x2", "x3", "x4", "x5", "x6", "x7", "x8", "x9", "x10"]
-    features.columns = feature_names
-
-    predictions_nparray = model.predict(features)
-    result = {"labels": predictions_nparray.tolist()}
-
-    return jsonify(result)
+    # Warm-up requests (see warmup.py) are not recorded and bypass the prediction cache
+    warming = is_warmup(request.environ)
+    with track_request(record=not warming) as timer:
+        # Decode the body straight into an (n, 10) float64 array, the features are
+        # taken by position like the original DataFrame column rename did.
+        # Binary bodies carry dtype and shape, no per-float JSON parsing needed
+        try:
+            with timer.phase("parse"):
+                if request.mimetype == JSON_MIMETYPE:
+                    features = records_to_array(request.get_json())
+                else:
+                    features = decode_array(request.get_data(), request.mimetype)
+        except PayloadError as e:
+            timer.outcome = "client_error"
+            return jsonify({"error": str(e)}), e.status
+        timer.rows = len(features)
+
+        with timer.phase("predict"):
+            predictions_nparray = cached_predict(None if warming else prediction_cache, model_version, predictor, features)
+
+        # Clients sending 'Accept: application/x-npy' get the labels as packed int32 array
+        with timer.phase("serialize"):
+            if request.accept_mimetypes.best_match([JSON_MIMETYPE, NPY_MIMETYPE]) == NPY_MIMETYPE:
+                return Response(encode_labels(predictions_nparray), mimetype=NPY_MIMETYPE)
+            result = {"labels": predictions_nparray.tolist()}
+
+            return jsonify(result)
+
+
+@app.route("/predict/stream", methods=["POST"])
+def predict_labels_stream():
+    """
+    Handles streaming prediction requests for very large payloads.
+    Accepts newline-delimited JSON feature records, predicted in blocks of
+    STREAM_BLOCK_ROWS rows while the body is read (see payload.py), and streams
+    back one {"labels": [...]} line per block.
+    """
+    if predictor is None:
+        return jsonify({"error": "Model is not available. Check server logs for details."}), 500
+    if request.mimetype != NDJSON_MIMETYPE:
+        return jsonify({"error": f"Expected Content-Type '{NDJSON_MIMETYPE}'"}), 415
+    return Response(stream_with_context(track_stream(
+        lambda timer: stream_predictions(request.stream, predictor.predict, timer=timer))),
+                    mimetype=NDJSON_MIMETYPE)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics aggregated over all workers (see serving_metrics.py)."""
+    body, content_type = metrics_response()
+    return Response(body, headers={"Content-Type": content_type})
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: the worker process is running."""
+    return jsonify({"status": "ok"})
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: 200 once this worker is warmed up (see warmup.py), 503 before."""
+    if warmup.state == "cold":
+        # Not started by gunicorn.conf.py, e.g. under flask run
+        warmup.run(flask_sender(app))
+    return jsonify(warmup.status()), 200 if warmup.ready else 503
 
 
 # This block is only for local debugging (e.g., 'python gunicorn
@@ -1,31 +1,85 @@
-import pandas as pd
 import mlflow
+from mlflow.tracking import MlflowClient
+import os
 import sys
+import time
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+
+from centroid_model import build_predictor
+from model_cache import registry_model_path
+from model_reloader import ModelReloader
+from prediction_cache import build_cache, cached_predict
+from payload import (
+    JSON_MIMETYPE,
+    NDJSON_MIMETYPE,
+    NPY_MIMETYPE,
+    PayloadError,
+    decode_array,
+    encode_labels,
+    records_to_array,
+    stream_predictions,
+)
+from serving_metrics import metrics_response, record_model, track_request, track_stream
+from warmup import flask_sender, install, is_warmup, signature_columns
 
 # Configure logging for Gunicorn
 logging.basicConfig(level=logging.INFO)
 
-# Global model variable
+MLFLOW_TRACKING_URI = "http://localhost:5050"
+MODEL_NAME = "dtc_persona_clustering_model"
+MODEL_STAGE = "Production"
+# Seconds between registry checks for a newly promoted version (0: only on POST /admin/reload)
+MODEL_POLL_INTERVAL = float(os.getenv("MODEL_POLL_INTERVAL", "60"))
+
+# Global model variables
 model = None
+model_version = None
+# Serves the active (version, predictor) and hot-swaps new Production versions (see model_reloader.py)
+reloader = None
+# Optional LRU cache of predicted labels (PREDICTION_CACHE_SIZE, see prediction_cache.py)
+prediction_cache = None
+# Warm-up state of this worker, run before it accepts connections (see warmup.py)
+warmup = None
+
+
+def production_version():
+    """Return the version currently in MODEL_STAGE, None if there is none."""
+    versions = MlflowClient().get_latest_versions(MODEL_NAME, stages=[MODEL_STAGE])
+    return versions[0].version if versions else None
+
+
+def load_version(version):
+    """
+    Load a model version and build its predictor (NumPy kernel or pyfunc, see centroid_model.py).
+    The model files come from the local model cache if present (see model_cache.py).
+    """
+    start = time.perf_counter()
+    predictor = build_predictor(mlflow.pyfunc.load_model(registry_model_path(MODEL_NAME, version)))
+    # Called by the reloader right before the swap
+    record_model(version, time.perf_counter() - start, previous_version=reloader.active[0] if reloader else None)
+    if prediction_cache is not None:
+        prediction_cache.invalidate(version)
+    return predictor
+
 
 def load_model():
     """
     Load the MLflow model from the model registry and assign to the global 'model' variable.
     Exits the process if loading fails.
     """
-    global model
-    MLFLOW_TRACKING_URI = "http://localhost:5050"
-    MODEL_NAME = "dtc_persona_clustering_model"
-    MODEL_STAGE = "Production"
-    MODEL_URI = f"models:/{MODEL_NAME}/{MODEL_STAGE}"
+    global model, model_version
     model = None
     try:
         mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
         logging.info(f"Connecting to MLflow Tracking Server at: {MLFLOW_TRACKING_URI}")
         logging.info(f"Loading model '{MODEL_NAME}' from stage '{MODEL_STAGE}'...")
-        model = mlflow.pyfunc.load_model(model_uri=MODEL_URI)
+        model_version = production_version()
+        if model_version is None:
+            raise mlflow.exceptions.MlflowException(f"No version of '{MODEL_NAME}' in stage '{MODEL_STAGE}'")
+        start = time.perf_counter()
+        model = mlflow.pyfunc.load_model(registry_model_path(MODEL_NAME, model_version))
+        record_model(model_version, time.perf_counter() - start)
     except mlflow.exceptions.RestException as e:
         logging.error("Failed to load the model due to an MLflow REST API error.")
         logging.error(f"Check if MLflow server is running at '{MLFLOW_TRACKING_URI}', if model '{MODEL_NAME}' exists, and if it has a version in stage '{MODEL_STAGE}'.")
@@ -35,7 +89,7 @@ def load_model():
         logging.error(f"Unexpected error occurred while loading the model: {e}")
         sys.exit(1)
     else:
-        logging.info("Model loaded successfully!")
+        logging.info(f"Model version {model_version} loaded successfully!")
         if hasattr(model, "metadata"):
             logging.info(f"Model Signature: {model.metadata.signature}")
 
@@ -44,26 +98,120 @@ app = Flask("label_predictor")
 
 # Load model at startup (for Gunicorn --preload efficiency)
 load_model()
+reloader = ModelReloader(model_version, build_predictor(model), load_version, production_version, MODEL_POLL_INTERVAL)
+prediction_cache = build_cache(model_version)
+warmup = install(app, signature_columns(model))
+
+
+@app.before_request
+def start_reloader():
+    # Threads do not survive gunicorn's fork, so every worker starts its own reloader thread
+    reloader.start()
 
 
 @app.route("/predict", methods=["POST"])
 def predict_labels():
     """
-    Predict persona labels for input features (expects JSON array of feature dicts).
-    Returns: JSON with predicted labels.
+    Predict persona labels for input features.
+    Expects a JSON array of feature dicts, or a binary body (.npy / Arrow IPC, see payload.py).
+    Returns: JSON with predicted labels and the model version, or a packed int32 .npy array
+    if requested via Accept. The model version is also sent in the X-Model-Version header.
+    """
+    # One read of the active pair, a concurrent swap cannot mix two versions in one request
+    version, predictor = reloader.active
+    # Warm-up requests (see warmup.py) are not recorded and bypass the prediction cache
+    warming = is_warmup(request.environ)
+    with track_request(record=not warming) as timer:
+        try:
+            with timer.phase("parse"):
+                if request.mimetype == JSON_MIMETYPE:
+                    features = records_to_array(request.get_json())
+                else:
+                    features = decode_array(request.get_data(), request.mimetype)
+        except PayloadError as e:
+            timer.outcome = "client_error"
+            return jsonify({"error": str(e)}), e.status
+        timer.rows = len(features)
+        with timer.phase("predict"):
+            predictions_nparray = cached_predict(None if warming else prediction_cache, version, predictor, features)
+        with timer.phase("serialize"):
+            if request.accept_mimetypes.best_match([JSON_MIMETYPE, NPY_MIMETYPE]) == NPY_MIMETYPE:
+                response = Response(encode_labels(predictions_nparray), mimetype=NPY_MIMETYPE)
+            else:
+                response = jsonify({"labels": predictions_nparray.tolist(), "model_version": version})
+        response.headers["X-Model-Version"] = version
+        return response
+
+
+@app.route("/predict/stream", methods=["POST"])
+def predict_labels_stream():
+    """
+    Predict persona labels for a newline-delimited JSON body of feature records, read and
+    predicted in blocks of STREAM_BLOCK_ROWS rows (see payload.py).
+    Returns: one JSON line {"labels": [...]} per block, streamed while the body is read.
+    """
+    if request.mimetype != NDJSON_MIMETYPE:
+        return jsonify({"error": f"Expected Content-Type '{NDJSON_MIMETYPE}'"}), 415
+    version, predictor = reloader.active
+    response = Response(stream_with_context(track_stream(
+        lambda timer: stream_predictions(request.stream, predictor.predict, timer=timer))),
+                        mimetype=NDJSON_MIMETYPE)
+    response.headers["X-Model-Version"] = version
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics aggregated over all workers (see serving_metrics.py)."""
+    body, content_type = metrics_response()
+    return Response(body, headers={"Content-Type": content_type})
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: the worker process is running."""
+    return jsonify({"status": "ok"})
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: 200 once this worker is warmed up (see warmup.py), 503 before."""
+    if warmup.state == "cold":
+        # Not started by gunicorn.conf.py, e.g. under flask run
+        warmup.run(flask_sender(app))
+    return jsonify(warmup.status()), 200 if warmup.ready else 503
+
+
+@app.route("/status", methods=["GET"])
+def status():
+    """Report the model version served by this worker, its prediction cache and warm-up."""
+    return jsonify({"model_name": MODEL_NAME, "model_stage": MODEL_STAGE, **reloader.status(),
+                    "prediction_cache": prediction_cache.stats() if prediction_cache is not None else None,
+                    "warmup": warmup.status()})
+
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """
+    Ask the workers to check the registry for a new Production version now (local clients only).
+    The new version is loaded in the background, requests keep being served by the active one.
+    All workers are reached only under --preload (see model_reloader.py), otherwise only the
+    worker handling this request reloads and the response says so.
     """
-    if model is None:
-        return (
-            jsonify({"error": "Model is not available. Check server logs for details."}),
-            500,
-        )
-    json_data = request.get_json()
-    features = pd.DataFrame(json_data)
-    feature_names = [f"x{i}" for i in range(1, 11)]
-    features.columns = feature_names
-    predictions_nparray = model.predict(features)
-    result = {"labels": predictions_nparray.tolist()}
-    return jsonify(result)
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"error": "Reload is only allowed from localhost."}), 403
+    reloader.request_reload()
+    result = {"status": "reload requested", "model_version": reloader.active[0]}
+    if reloader.shared_reload:
+        result["scope"] = "all workers"
+    else:
+        result["scope"] = f"this worker only (pid {os.getpid()})"
+        if MODEL_POLL_INTERVAL > 0:
+            others = f"pick up the new version at their next poll (MODEL_POLL_INTERVAL={MODEL_POLL_INTERVAL}s)"
+        else:
+            others = "keep their version, polling is disabled (MODEL_POLL_INTERVAL=0)"
+        result["warning"] = f"The server was not started with --preload, the other workers {others}."
+    return jsonify(result), 202
 
 # For local debugging only (not used by Gunicorn)
 # if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""
+Request micro-batching for the async predict service.
+
+Concurrent requests each carry a handful of rows; predicting them one by one spends most
+of the time on per-call overhead. MicroBatcher queues the feature arrays of concurrent
+requests and, once a window closes - max_rows rows collected or max_wait seconds passed
+since the first queued request - runs one vectorized prediction over the concatenated
+rows and hands every request its slice of the labels.
+
+The prediction runs in a worker thread (NumPy releases the GIL), so the event loop keeps
+accepting requests and fills the next batch meanwhile.
+
+Every request's features are validated before they are queued, so a malformed request
+fails on its own instead of breaking the concatenation of a shared batch. Should the
+batch prediction still fail, its requests are predicted one by one and only the
+failing ones receive the exception.
+"""
+
+import asyncio
+import logging
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Coalesce concurrent predict calls into micro-batches."""
+
+    def __init__(self, predict, max_rows=4096, max_wait=0.002, validate=None):
+        """
+        Args:
+            predict (callable): (n, d) array -> (tag, labels). The tag (e.g. the model
+                version) is returned to every request of the batch.
+            max_rows (int): Rows that close a batch early.
+            max_wait (float): Seconds a batch stays open after its first request.
+            validate (callable): Raises for the features of a request that must not join
+                a batch, called before the request is queued.
+        """
+        self.predict_batch = predict
+        self.validate = validate
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        self.requests = 0
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        """Start the batching loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, features):
+        """Predict the labels of one request's features. Returns (tag, labels)."""
+        if self.validate is not None:
+            self.validate(features)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, future))
+        return await future
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "rows": self.rows,
+            "mean_batch_requests": round(self.requests / self.batches, 2) if self.batches else 0,
+            "mean_batch_rows": round(self.rows / self.batches, 2) if self.batches else 0,
+            "max_rows": self.max_rows,
+            "max_wait": self.max_wait,
+        }
+
+    async def _collect(self):
+        """Wait for the first request, then collect more until the window closes."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while rows < self.max_rows:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        # Take what is already queued without waiting, up to max_rows
+        while rows < self.max_rows and not self._queue.empty():
+            item = self._queue.get_nowait()
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            features = [item[0] for item in batch]
+            futures = [item[1] for item in batch]
+            try:
+                tag, labels = await asyncio.to_thread(self.predict_batch, np.concatenate(features))
+            except Exception as e:
+                logging.error(f"Micro-batch prediction failed for {len(batch)} requests: {e}")
+                await self._predict_separately(batch)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            self.rows += len(labels)
+            offsets = np.cumsum([len(f) for f in features])[:-1]
+            for future, part in zip(futures, np.split(labels, offsets)):
+                if not future.done():  # the client may have disconnected
+                    future.set_result((tag, part))
+
+    async def _predict_separately(self, batch):
+        """Predict the requests of a failed batch one by one, failing only those that fail alone."""
+        for features, future in batch:
+            try:
+                result = await asyncio.to_thread(self.predict_batch, features)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += 1
+            self.rows += len(features)
+            if not future.done():
+                future.set_result(result)
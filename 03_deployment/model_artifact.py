@@ -0,0 +1,110 @@
+"""
+Minimal serving artifact of the persona clustering model.
+
+A KMeans model is fully described by its cluster centers, so the serving artifact is
+a directory with two files:
+
+    centroids.npy   (n_clusters, n_features) float64 cluster centers
+    metadata.json   feature order, model name/version/run, SHA-256 of centroids.npy
+
+It is written by export_model_artifact.py and loaded by gunicorn_predict_artifact.py
+with NumPy only - no mlflow, sklearn or google-cloud-storage import is needed.
+
+With mmap=True the centers are a read-only memory map of centroids.npy: all worker
+processes map the same page-cache pages instead of holding private copies. The file is
+mapped once and the checksum is computed over the mapping, so verifying it does not
+read a private copy of the file either.
+"""
+
+import hashlib
+import io
+import json
+import mmap
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+FEATURE_COLUMNS = ["x1", "x2", "x3", "x4", "x5", "x6", "x7", "x8", "x9", "x10"]
+
+CENTROIDS_FILE = "centroids.npy"
+METADATA_FILE = "metadata.json"
+
+# Bumped whenever the layout of the artifact changes
+ARTIFACT_FORMAT = 1
+
+
+def write_artifact(directory, centers, feature_names, model_name, model_version, run_id=None, model_uri=None):
+    """Write centroids.npy and metadata.json to directory. Returns the metadata."""
+    os.makedirs(directory, exist_ok=True)
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(centers, dtype=np.float64), allow_pickle=False)
+    centroids_bytes = buffer.getvalue()
+    metadata = {
+        "format": ARTIFACT_FORMAT,
+        "model_name": model_name,
+        "model_version": str(model_version),
+        "run_id": run_id,
+        "model_uri": model_uri,
+        "feature_names": list(feature_names),
+        "n_clusters": int(centers.shape[0]),
+        "centroids_sha256": hashlib.sha256(centroids_bytes).hexdigest(),
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(directory, CENTROIDS_FILE), "wb") as f:
+        f.write(centroids_bytes)
+    with open(os.path.join(directory, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def map_npy(path):
+    """
+    Map a .npy file read-only. Returns (array, mapping): the array is a view of the
+    mapping past the .npy header, the mapping covers the whole file.
+    """
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if dtype.hasobject:
+            raise ValueError(f"{path} holds Python objects")
+        offset = f.tell()
+        # The mapping stays valid after the file is closed
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    array = np.ndarray(shape, dtype=dtype, buffer=mapping, offset=offset, order="F" if fortran_order else "C")
+    return array, mapping
+
+
+def load_artifact(directory, mmap=False):
+    """
+    Load the artifact in directory. Returns (centers, metadata).
+
+    With mmap=True the centers are a read-only view of a memory map of centroids.npy,
+    the checksum is computed over the same mapping.
+    Raises ValueError if centroids.npy does not match the checksum, or the feature
+    names recorded in metadata.json are not the serving FEATURE_COLUMNS (in any order,
+    CentroidModel.from_centers reorders the columns).
+    """
+    with open(os.path.join(directory, METADATA_FILE)) as f:
+        metadata = json.load(f)
+    if metadata.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported artifact format {metadata.get('format')}, expected {ARTIFACT_FORMAT}")
+    if sorted(metadata["feature_names"]) != sorted(FEATURE_COLUMNS):
+        raise ValueError(f"Artifact features {metadata['feature_names']} do not match the served {FEATURE_COLUMNS}")
+    centroids_path = os.path.join(directory, CENTROIDS_FILE)
+    if mmap:
+        centers, centroids_bytes = map_npy(centroids_path)
+    else:
+        with open(centroids_path, "rb") as f:
+            centroids_bytes = f.read()
+    checksum = hashlib.sha256(centroids_bytes).hexdigest()
+    if checksum != metadata["centroids_sha256"]:
+        raise ValueError(f"Checksum mismatch for {CENTROIDS_FILE}: {checksum} != {metadata['centroids_sha256']}")
+    if not mmap:
+        centers = np.load(io.BytesIO(centroids_bytes), allow_pickle=False)
+    if centers.shape != (metadata["n_clusters"], len(metadata["feature_names"])):
+        raise ValueError(f"Centroids of shape {centers.shape} do not match the metadata")
+    return centers, metadata
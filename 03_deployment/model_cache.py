@@ -0,0 +1,175 @@
+"""
+Local, content-addressed on-disk cache for model artifacts.
+
+The serving apps, the batch script and 01_model/model_load.py download the model from the
+MLflow server or GCS at every process start. ModelCache keeps the downloaded files on disk:
+
+    <root>/objects/<sha256>/...            model files, addressed by the checksum of their content
+    <root>/refs/<name>/<version>.json      name + version -> checksum and source fingerprint
+
+A reference is only trusted while its fingerprint - cheap version metadata of the source
+such as the run id and source URI of a registry version, or the generation and MD5 of a
+GCS blob - matches what the source reports now, so a stale entry is detected with one
+metadata call instead of a download. Objects are evicted least recently used first once
+the cache grows beyond max_bytes.
+
+Defaults can be set with MODEL_CACHE_DIR and MODEL_CACHE_MAX_BYTES.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dtc_persona_analysis", "models")
+DEFAULT_MAX_BYTES = 1024**3  # 1 GB
+
+
+def directory_checksum(path):
+    """SHA-256 over the relative paths and contents of all files below path."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file_name in sorted(files):
+            file_path = os.path.join(root, file_name)
+            digest.update(os.path.relpath(file_path, path).encode())
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, file_name))
+        for root, _, files in os.walk(path)
+        for file_name in files
+    )
+
+
+class ModelCache:
+    """Content-addressed model cache with fingerprint validation and LRU size eviction."""
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or os.getenv("MODEL_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes or os.getenv("MODEL_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.refs_dir = os.path.join(self.root, "refs")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        for directory in (self.objects_dir, self.refs_dir, self.tmp_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def _ref_path(self, name, version):
+        # Model names may be paths (e.g. GCS blobs), keep one directory level per name
+        return os.path.join(self.refs_dir, name.replace("/", "__"), f"{version}.json")
+
+    def get(self, name, version, fingerprint):
+        """Return the cached directory of name/version, None if missing or stale."""
+        ref_path = self._ref_path(name, version)
+        try:
+            with open(ref_path) as f:
+                ref = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if ref["fingerprint"] != fingerprint:
+            logging.info(f"Model cache: {name} version {version} changed at the source, dropping the stale entry")
+            os.remove(ref_path)
+            return None
+        object_path = os.path.join(self.objects_dir, ref["checksum"])
+        if not os.path.isdir(object_path):
+            return None  # evicted
+        os.utime(object_path)  # mark as recently used
+        return object_path
+
+    def put(self, name, version, fingerprint, download):
+        """
+        Download name/version with download(directory) and add it to the cache.
+        Returns the cached directory.
+        """
+        staging = tempfile.mkdtemp(dir=self.tmp_dir)
+        try:
+            download(staging)
+            checksum = directory_checksum(staging)
+            object_path = os.path.join(self.objects_dir, checksum)
+            try:
+                os.rename(staging, object_path)
+            except OSError:
+                # Same content is already cached (e.g. by a concurrent process)
+                shutil.rmtree(staging, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        os.utime(object_path)
+
+        ref_path = self._ref_path(name, version)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        ref = {"name": name, "version": str(version), "fingerprint": fingerprint, "checksum": checksum,
+               "cached_at": time.time()}
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(ref_path), delete=False, suffix=".tmp") as f:
+            json.dump(ref, f)
+        os.replace(f.name, ref_path)  # atomic, readers never see a partial reference
+
+        self.evict(keep=checksum)
+        return object_path
+
+    def fetch(self, name, version, fingerprint, download):
+        """Return the cached directory of name/version, downloading it on a miss."""
+        path = self.get(name, version, fingerprint)
+        if path is not None:
+            logging.info(f"Model cache: hit for {name} version {version}")
+            return path
+        logging.info(f"Model cache: miss for {name} version {version}, downloading...")
+        return self.put(name, version, fingerprint, download)
+
+    def evict(self, keep=None):
+        """Remove least recently used objects until the cache fits into max_bytes."""
+        objects = []
+        for checksum in os.listdir(self.objects_dir):
+            path = os.path.join(self.objects_dir, checksum)
+            objects.append((os.path.getmtime(path), directory_size(path), checksum, path))
+        total = sum(size for _, size, _, _ in objects)
+        for _, size, checksum, path in sorted(objects):
+            if total <= self.max_bytes:
+                break
+            if checksum == keep:
+                continue
+            logging.info(f"Model cache: evicting {checksum[:12]} ({size} bytes)")
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def registry_model_path(name, version, cache=None):
+    """
+    Return a local directory holding the MLflow model name/version from the registry.
+
+    The registry's run id and source of the version are its fingerprint. The tracking
+    URI must be set before calling.
+    """
+    import mlflow
+    from mlflow.tracking import MlflowClient
+
+    model_version = MlflowClient().get_model_version(name, str(version))
+    fingerprint = {"run_id": model_version.run_id, "source": model_version.source}
+
+    def download(directory):
+        mlflow.artifacts.download_artifacts(artifact_uri=f"models:/{name}/{version}", dst_path=directory)
+
+    return (cache or ModelCache()).fetch(name, version, fingerprint, download)
+
+
+def gcs_blob_path(blob, cache=None):
+    """
+    Return a local directory holding the GCS blob as a file of the same base name.
+
+    The blob's generation and MD5 are its fingerprint, read with one metadata request.
+    """
+    blob.reload()
+    fingerprint = {"generation": blob.generation, "md5_hash": blob.md5_hash}
+
+    def download(directory):
+        blob.download_to_filename(os.path.join(directory, os.path.basename(blob.name)))
+
+    return (cache or ModelCache()).fetch(f"{blob.bucket.name}/{blob.name}", blob.generation, fingerprint, download)
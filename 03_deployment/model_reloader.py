@@ -0,0 +1,115 @@
+"""
+Hot reload of the served model without restarting the server.
+
+ModelReloader holds the active (version, predictor) pair. Requests read it with a single
+attribute access and a reload replaces it with a single assignment, so every request is
+served by one consistent model and a swap never blocks or drops a request.
+
+A background thread in every worker process polls for a new version every poll_interval
+seconds, loads it off the request path and swaps it in. request_reload() (the admin
+endpoint) bumps a generation counter in shared memory; when the reloader is created
+before gunicorn forks its workers (--preload), all workers see the bump and check for a
+new version within a second. Without --preload every worker creates its own reloader and
+counter, so a bump only reaches the worker that handled it (shared_reload is False) and
+the others pick up the new version at their next poll.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Seconds between checks of the shared reload generation
+TICK = 1.0
+
+
+class ModelReloader:
+    """Serve a (version, predictor) pair and swap it when a new version appears."""
+
+    def __init__(self, version, predictor, load_version, latest_version, poll_interval=60):
+        """
+        Args:
+            version (str): Version of the initially loaded predictor.
+            predictor: Object with a predict(X) method.
+            load_version (callable): version -> predictor, loads a model version.
+            latest_version (callable): () -> version that should be served, None if unknown.
+            poll_interval (float): Seconds between polls, 0 to only reload on request_reload().
+        """
+        self.active = (version, predictor)
+        self.load_version = load_version
+        self.latest_version = latest_version
+        self.poll_interval = poll_interval
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        self.last_check = None
+        # Shared with the workers forked after this object was created
+        self.generation = multiprocessing.Value("L", 0)
+        self._owner_pid = os.getpid()
+        self._thread_pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the reload thread in the current process, once per process (forked workers included)."""
+        with self._start_lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name="model-reloader", daemon=True).start()
+
+    @property
+    def shared_reload(self):
+        """True if the generation counter was created before this process was forked (--preload)."""
+        return os.getpid() != self._owner_pid
+
+    def request_reload(self):
+        """
+        Ask the reloader threads to check for a new version now: of all workers if
+        shared_reload, else only of the current process.
+        """
+        with self.generation.get_lock():
+            self.generation.value += 1
+
+    def check(self):
+        """Load and swap in the latest version if it differs from the active one. Returns the active version."""
+        try:
+            latest = self.latest_version()
+        except Exception as e:
+            logging.warning(f"Model reloader: checking for a new version failed: {e}")
+            return self.active[0]
+        self.last_check = datetime.now(timezone.utc).isoformat()
+        current = self.active[0]
+        if latest is None or latest == current:
+            return current
+        logging.info(f"Model reloader: loading version {latest} (serving {current})...")
+        try:
+            predictor = self.load_version(latest)
+        except Exception as e:
+            logging.error(f"Model reloader: loading version {latest} failed, keeping {current}: {e}")
+            return current
+        self.active = (latest, predictor)
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        logging.info(f"Model reloader: now serving version {latest} (pid {os.getpid()})")
+        return latest
+
+    def status(self):
+        return {
+            "model_version": self.active[0],
+            "loaded_at": self.loaded_at,
+            "last_check": self.last_check,
+            "poll_interval": self.poll_interval,
+            "shared_reload": self.shared_reload,
+            "pid": os.getpid(),
+        }
+
+    def _run(self):
+        seen = self.generation.value
+        next_poll = time.monotonic() + self.poll_interval
+        while True:
+            time.sleep(TICK)
+            generation = self.generation.value
+            due = self.poll_interval > 0 and time.monotonic() >= next_poll
+            if generation != seen or due:
+                seen = generation
+                next_poll = time.monotonic() + self.poll_interval
+                self.check()
@@ -0,0 +1,253 @@
+"""
+Request and response payload formats of the /predict endpoint.
+
+Besides the original JSON list of feature records, /predict accepts columnar binary
+bodies, selected by the request Content-Type:
+
+    application/json                     JSON array of feature records (default)
+    application/x-npy                    NumPy .npy file of an (n, 10) float32/float64 array
+    application/vnd.apache.arrow.stream  Arrow IPC stream with the columns x1..x10
+
+The .npy header carries the dtype and shape, so the body is decoded without parsing a
+single float. float32 bodies halve the transfer size; they are widened to float64 on
+the server, the dtype the model was fitted on. Arrow IPC needs pyarrow, which is optional and only imported on first use.
+The labels are returned as JSON, or as a packed int32 .npy array if the client sends
+'Accept: application/x-npy'.
+
+For very large requests, /predict/stream reads newline-delimited JSON records
+(application/x-ndjson) incrementally, predicts them in blocks of STREAM_BLOCK_ROWS rows
+and streams one {"labels": [...]} line back per block, so the server holds a single
+block at a time whatever the request size.
+"""
+
+import io
+import json
+import os
+
+import numpy as np
+
+FEATURE_COLUMNS = ["x1", "x2", "x3", "x4", "x5", "x6", "x7", "x8", "x9", "x10"]
+
+JSON_MIMETYPE = "application/json"
+NPY_MIMETYPE = "application/x-npy"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# Rows predicted per block by /predict/stream
+STREAM_BLOCK_ROWS = int(os.getenv("STREAM_BLOCK_ROWS", "10000"))
+# A longer NDJSON line is rejected instead of being buffered (a record is ~200 bytes)
+MAX_LINE_BYTES = 64 * 1024
+
+# Payload formats selectable by clients
+PAYLOAD_FORMATS = {"json": JSON_MIMETYPE, "npy": NPY_MIMETYPE, "arrow": ARROW_MIMETYPE}
+
+
+class PayloadError(ValueError):
+    """Raised for request bodies that cannot be decoded into the feature frame."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def import_pyarrow():
+    """Import pyarrow on first use, it is optional and slow to import at server start."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise PayloadError("Arrow IPC payloads need pyarrow", status=415)
+    return pa
+
+
+def check_shape(array):
+    """
+    Raise PayloadError (status 400) unless array holds n rows of the 10 features, all
+    finite. The nearest-centroid kernel would assign NaN rows a label instead of failing
+    like the sklearn model does.
+    """
+    if array.ndim != 2 or array.shape[1] != len(FEATURE_COLUMNS):
+        raise PayloadError(f"Expected an (n, {len(FEATURE_COLUMNS)}) array, got shape {array.shape}")
+    if not np.isfinite(array).all():
+        raise PayloadError("Features must be finite numbers, got null, NaN or infinity")
+
+
+def records_to_array(records):
+    """
+    Convert a JSON array of feature records into an (n, 10) float64 array.
+
+    Like the original DataFrame path, the values are taken by position, so records
+    may be dicts with any key names (x1..x10, '0'..'9') or plain lists.
+    """
+    if not isinstance(records, list):
+        raise PayloadError("Expected a JSON array of feature records")
+    rows = [list(record.values()) if isinstance(record, dict) else record for record in records]
+    try:
+        array = np.array(rows, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise PayloadError(f"Expected records of {len(FEATURE_COLUMNS)} numbers")
+    check_shape(array)
+    return array
+
+
+def decode_array(body, mimetype):
+    """
+    Decode a binary request body into a C-contiguous (n, 10) float64 array.
+
+    Raises PayloadError (status 415) for unsupported content types and (status 400)
+    for corrupt bodies and bodies that do not hold 10 finite numeric feature columns.
+    """
+    if mimetype == NPY_MIMETYPE:
+        try:
+            array = np.load(io.BytesIO(body), allow_pickle=False)
+        except (ValueError, EOFError) as e:
+            # Also raised for object arrays, which would need unpickling
+            raise PayloadError(f"Invalid .npy body: {e}")
+        if not isinstance(array, np.ndarray):
+            # np.load returns an NpzFile for .npz archives
+            array.close()
+            raise PayloadError("Expected a single .npy array, got an .npz archive")
+    elif mimetype == ARROW_MIMETYPE:
+        pa = import_pyarrow()
+        try:
+            table = pa.ipc.open_stream(body).read_all()
+            array = np.column_stack([column.to_numpy() for column in table.columns])
+        except (pa.ArrowException, OSError, ValueError) as e:
+            raise PayloadError(f"Invalid Arrow IPC body: {e}")
+    else:
+        raise PayloadError(f"Unsupported content type '{mimetype}'", status=415)
+    dtype = array.dtype
+    # Casting would silently drop the imaginary part
+    if dtype.kind == "c":
+        raise PayloadError(f"Expected real features, got dtype {dtype}")
+    try:
+        array = np.ascontiguousarray(array, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise PayloadError(f"Expected numeric features, got dtype {dtype}")
+    check_shape(array)
+    return array
+
+
+def encode_labels(labels):
+    """Pack predicted labels into an int32 .npy body."""
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(labels, dtype=np.int32), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def block_to_array(records, line_numbers):
+    """
+    records_to_array() for a block of NDJSON records read from line_numbers. Returns
+    (array, error): if a record is not numeric or not finite, the array holds the rows
+    before it (None if there are none) and error is a PayloadError naming its line.
+    """
+    try:
+        return records_to_array(records), None
+    except PayloadError:
+        pass
+    # Rare, find the first bad record one row at a time
+    for i, values in enumerate(records):
+        try:
+            records_to_array([values])
+        except PayloadError as e:
+            return (records_to_array(records[:i]) if i else None), PayloadError(f"Line {line_numbers[i]}: {e}")
+    return records_to_array(records), None
+
+
+def iter_ndjson_blocks(stream, block_rows=STREAM_BLOCK_ROWS):
+    """
+    Read newline-delimited JSON records from a file-like stream and yield them as
+    (n, 10) float64 arrays of up to block_rows rows. Blank lines are skipped.
+
+    Raises PayloadError, naming the line, at the first line that is not a record of 10
+    finite numbers. The valid records read before it are yielded first.
+    """
+    records, line_numbers = [], []
+    error = None
+    line_number = 0
+    while error is None:
+        line = stream.readline(MAX_LINE_BYTES + 1)
+        if not line:
+            break
+        line_number += 1
+        if len(line) > MAX_LINE_BYTES:
+            error = PayloadError(f"Line {line_number} is longer than {MAX_LINE_BYTES} bytes")
+            break
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            error = PayloadError(f"Line {line_number} is not valid JSON: {e}")
+            break
+        values = list(record.values()) if isinstance(record, dict) else record
+        if not isinstance(values, list) or len(values) != len(FEATURE_COLUMNS):
+            error = PayloadError(f"Line {line_number} is not a record of {len(FEATURE_COLUMNS)} features")
+            break
+        records.append(values)
+        line_numbers.append(line_number)
+        if len(records) == block_rows:
+            block, error = block_to_array(records, line_numbers)
+            if block is not None:
+                yield block
+            records, line_numbers = [], []
+    if records:
+        block, block_error = block_to_array(records, line_numbers)
+        if block is not None:
+            yield block
+        # A bad value in the buffered rows comes before the line that ended the read
+        error = block_error or error
+    if error is not None:
+        raise error
+
+
+def stream_predictions(stream, predict, block_rows=STREAM_BLOCK_ROWS, timer=None):
+    """
+    Yield one NDJSON line {"labels": [...]} per block of records read from stream.
+
+    The response status is sent before the body is read, so a malformed line ends the
+    stream with a final {"error": ...} line instead of an error status; the rows before
+    it are predicted and streamed first. The rows and outcome are recorded on timer, the
+    RequestTimer of the request if given (see serving_metrics.track_stream).
+    """
+    rows = 0
+    try:
+        for features in iter_ndjson_blocks(stream, block_rows):
+            labels = predict(features)
+            rows += len(labels)
+            if timer is not None:
+                timer.rows = rows
+            yield json.dumps({"labels": labels.tolist()}).encode() + b"\n"
+    except PayloadError as e:
+        if timer is not None:
+            timer.outcome = "client_error"
+        yield json.dumps({"error": str(e), "rows_predicted": rows}).encode() + b"\n"
+
+
+def request_kwargs(features, payload_format):
+    """
+    Return the requests.post() keyword arguments sending features in payload_format.
+
+    Binary formats also ask for the labels as a packed .npy array.
+    """
+    if payload_format == "json":
+        return {"json": features.to_dict(orient="records")}
+    if payload_format == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, features.to_numpy(), allow_pickle=False)
+        body = buffer.getvalue()
+    else:
+        pa = import_pyarrow()
+        sink = pa.BufferOutputStream()
+        table = pa.Table.from_pandas(features, preserve_index=False)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        body = sink.getvalue().to_pybytes()
+    headers = {"Content-Type": PAYLOAD_FORMATS[payload_format], "Accept": NPY_MIMETYPE}
+    return {"data": body, "headers": headers}
+
+
+def decode_labels(response):
+    """Return the labels of a /predict response (JSON or .npy), None if there are none."""
+    if response.headers.get("Content-Type", "").startswith(NPY_MIMETYPE):
+        return np.load(io.BytesIO(response.content), allow_pickle=False)
+    return response.json().get("labels")
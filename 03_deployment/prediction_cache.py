@@ -0,0 +1,171 @@
+"""
+Optional LRU cache of predicted labels for the predict services.
+
+Traffic repeats the same customer vectors. PredictionCache deduplicates the rows of a
+request, looks the unique rows up by a 64-bit hash of their bytes, predicts only the
+rows that are not cached and stores their labels, evicting the least recently used
+entries beyond max_entries.
+
+The rows are hashed with vectorized NumPy operations; a lookup is one dict access per
+unique row. The hash only picks the entry: every entry also keeps the 80 bytes of its
+row, which must equal the looked-up row for a hit, and rows grouped by hash within a
+request are compared too, so a hash collision costs a prediction, never a wrong label. The cache holds the labels of one model version: invalidate(version) is
+called when a new version is swapped in, and requests still served by another version
+bypass the cache.
+
+Whether it pays off depends on the backend: the NumPy nearest-centroid kernel predicts
+a row faster than a dict lookup, the pyfunc backend does not (see benchmark_prediction_cache.py).
+Enable it with PREDICTION_CACHE_SIZE=<entries> (default 0: off).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from serving_metrics import record_cache
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "0"))
+
+# Odd 64-bit multipliers of the row hash (from splitmix64 / murmur3), and one fixed odd
+# multiplier per column so that the hash depends on the position of every value
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+HASH_FINALIZER = np.uint64(0xBF58476D1CE4E5B9)
+COLUMN_MULTIPLIERS = np.random.default_rng(0x5EED).integers(0, 2**63, size=64, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+# Below this many rows, deduplicating in Python is faster than np.unique
+SMALL_REQUEST_ROWS = 64
+
+
+def hash_rows(X):
+    """Return a uint64 hash of the bytes of every row of the 2-D float64 array X."""
+    words = np.ascontiguousarray(X, dtype=np.float64).view(np.uint64)
+    # A fixed number of whole-array operations, independent of the number of columns:
+    # mix every value, combine the columns with a (wrapping) uint64 dot product, finalize
+    words = (words ^ (words >> np.uint64(31))) * HASH_MULTIPLIER
+    h = words @ COLUMN_MULTIPLIERS[:words.shape[1]]
+    h ^= h >> np.uint64(29)
+    h *= HASH_FINALIZER
+    return h ^ (h >> np.uint64(32))
+
+
+def unique_rows(X, hashes):
+    """
+    Return (unique hashes as a list, index of the first row of each, inverse index array)
+    of the rows of X with their hashes. Rows are grouped by equal bytes, the hashes are
+    only a faster key: if two different rows share a hash, X is deduplicated by its bytes
+    and the returned keys repeat.
+    """
+    keys, first_rows, inverse = unique_hashes(hashes)
+    if len(keys) == len(hashes) or np.array_equal(X, X[first_rows][inverse]):
+        return keys, first_rows, inverse
+    # Hash collision within the request
+    rows = np.ascontiguousarray(X, dtype=np.float64)
+    _, first_rows, inverse = np.unique(rows.view(np.dtype((np.void, rows.itemsize * rows.shape[1]))).ravel(),
+                                       return_index=True, return_inverse=True)
+    return hashes[first_rows].tolist(), first_rows, inverse.ravel()
+
+
+def unique_hashes(hashes):
+    """Return (unique hashes as a list, index of the first row of each, inverse index array)."""
+    if len(hashes) < SMALL_REQUEST_ROWS:
+        positions, first_rows = {}, []
+        inverse = []
+        for row, key in enumerate(hashes.tolist()):
+            position = positions.setdefault(key, len(positions))
+            if position == len(first_rows):
+                first_rows.append(row)
+            inverse.append(position)
+        return list(positions), np.array(first_rows), np.array(inverse)
+    keys, first_rows, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    return keys.tolist(), first_rows, inverse.ravel()
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of labels keyed by row hash, for one model version at a time.
+    Entries are (row bytes, label).
+    """
+
+    def __init__(self, max_entries, version=None):
+        self.max_entries = max_entries
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def invalidate(self, version):
+        """Drop all entries, the labels of version are cached from now on."""
+        with self._lock:
+            self._entries.clear()
+            self.version = version
+            self.invalidations += 1
+
+    def predict(self, version, predictor, X):
+        """
+        Predict the labels of X with predictor (of model version), serving cached rows from
+        the cache and predicting every distinct uncached row once.
+        Returns (labels, hits, misses, duplicates) with labels as an int32 array.
+        """
+        if version != self.version or len(X) == 0:
+            return np.asarray(predictor.predict(X), dtype=np.int32), 0, len(X), 0
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        keys, first_rows, inverse = unique_rows(X, hash_rows(X))
+        packed, width = X[first_rows].tobytes(), X.itemsize * X.shape[1]
+        row_bytes = [packed[i * width:(i + 1) * width] for i in range(len(keys))]
+        cached = []
+        with self._lock:
+            for key, row in zip(keys, row_bytes):
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == row:
+                    self._entries.move_to_end(key)
+                    cached.append(entry[1])
+                else:  # not cached, or another row with the same hash
+                    cached.append(None)
+        missing = [i for i, label in enumerate(cached) if label is None]
+        unique_labels = np.array([-1 if label is None else label for label in cached], dtype=np.int32)
+        if missing:
+            unique_labels[missing] = predictor.predict(X[first_rows[missing]])
+            with self._lock:
+                if version == self.version:  # not invalidated meanwhile
+                    for i in missing:
+                        self._entries[keys[i]] = (row_bytes[i], int(unique_labels[i]))
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        hits, misses, duplicates = len(keys) - len(missing), len(missing), len(X) - len(keys)
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.duplicates += duplicates
+        return unique_labels[inverse], hits, misses, duplicates
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "model_version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "duplicate_rows": self.duplicates,
+                "invalidations": self.invalidations,
+            }
+
+
+def build_cache(version, max_entries=PREDICTION_CACHE_SIZE):
+    """Return a PredictionCache for version, None if caching is off (max_entries 0)."""
+    return PredictionCache(max_entries, version) if max_entries > 0 else None
+
+
+def cached_predict(cache, version, predictor, X):
+    """Return predictor.predict(X), through cache unless it is None, and record the cache metrics."""
+    if cache is None:
+        return predictor.predict(X)
+    labels, hits, misses, duplicates = cache.predict(version, predictor, X)
+    record_cache(hits, misses, duplicates)
+    return labels
@@ -0,0 +1,202 @@
+"""
+Prometheus metrics of the predict services, served on GET /metrics.
+
+    predict_requests_total{outcome}            requests by outcome: ok, client_error, error
+    predict_request_seconds                    end-to-end latency of /predict (and /predict/stream)
+    predict_request_phase_seconds{phase}       latency of the parse, predict and serialize phases
+    predict_request_rows                       rows per request
+    predict_requests_in_flight                 requests being handled right now
+    predict_model_info{version}                1 for the model version served by a worker
+    predict_model_load_seconds                 duration of the last model load
+    predict_cache_rows_total{result}           rows by prediction cache result: hit, miss, duplicate
+    predict_warmup_seconds                     duration of the worker's warm-up (see warmup.py)
+
+Gunicorn workers are separate processes, so the metrics use the multiprocess mode of
+prometheus_client: every process writes its values to memory-mapped files in
+PROMETHEUS_MULTIPROC_DIR and /metrics aggregates the files of all workers. The directory
+must be set before prometheus_client is imported and be empty at server start;
+gunicorn.conf.py takes care of both. If it is not set, a fresh temporary directory is
+used, which is shared by all workers when the app is loaded with --preload.
+
+prometheus_client is optional: without it, or with PREDICT_METRICS=0, the helpers below
+do nothing and /metrics says so. Recording a request costs about 20 microseconds, eight
+writes to the memory-mapped files (see benchmark_metrics.py).
+"""
+
+import os
+import tempfile
+import time
+
+METRICS_ENABLED = os.getenv("PREDICT_METRICS", "1") != "0"
+
+if METRICS_ENABLED:
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="predict_metrics_")
+    try:
+        from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+        from prometheus_client import multiprocess
+    except ImportError:
+        METRICS_ENABLED = False
+
+PHASES = ["parse", "predict", "serialize"]
+OUTCOMES = ["ok", "client_error", "error"]
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROWS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 100000)
+
+if METRICS_ENABLED:
+    REQUESTS = Counter("predict_requests", "Predict requests by outcome", ["outcome"])
+    REQUEST_SECONDS = Histogram("predict_request_seconds", "End-to-end latency of /predict",
+                                buckets=LATENCY_BUCKETS)
+    REQUEST_PHASE_SECONDS = Histogram("predict_request_phase_seconds", "Latency of the /predict phases",
+                                      ["phase"], buckets=LATENCY_BUCKETS)
+    REQUEST_ROWS = Histogram("predict_request_rows", "Rows per predict request", buckets=ROWS_BUCKETS)
+    IN_FLIGHT = Gauge("predict_requests_in_flight", "Predict requests being handled",
+                      multiprocess_mode="livesum")
+    MODEL_INFO = Gauge("predict_model_info", "Model version served by the worker", ["version"],
+                       multiprocess_mode="liveall")
+    MODEL_LOAD_SECONDS = Gauge("predict_model_load_seconds", "Duration of the last model load",
+                               multiprocess_mode="liveall")
+    WARMUP_SECONDS = Gauge("predict_warmup_seconds", "Duration of the worker's warm-up",
+                           multiprocess_mode="liveall")
+    CACHE_ROWS = Counter("predict_cache_rows", "Rows by prediction cache result (see prediction_cache.py)",
+                         ["result"])
+    # Bound once, looking up label children on every request costs more than observing
+    PHASE_SECONDS = {phase: REQUEST_PHASE_SECONDS.labels(phase=phase) for phase in PHASES}
+    OUTCOME_REQUESTS = {outcome: REQUESTS.labels(outcome=outcome) for outcome in OUTCOMES}
+    CACHE_HITS, CACHE_MISSES, CACHE_DUPLICATES = (CACHE_ROWS.labels(result=result)
+                                                  for result in ("hit", "miss", "duplicate"))
+
+
+class Phase:
+    """Times one phase of a request, appends (name, seconds) to the request's phases."""
+
+    __slots__ = ("name", "phases", "start")
+
+    def __init__(self, name, phases):
+        self.name = name
+        self.phases = phases
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.phases.append((self.name, time.perf_counter() - self.start))
+
+
+class RequestTimer:
+    """
+    Records one /predict request: in-flight while open, then its latency, phase durations,
+    row count and outcome. Usage:
+
+        with track_request() as timer:
+            with timer.phase("parse"):
+                ...
+            timer.rows = len(features)
+
+    Set timer.outcome = "client_error" for rejected requests; exceptions count as "error".
+    With record=False (the warm-up requests, see warmup.py) nothing is recorded; the
+    choice is made per request, so requests handled concurrently are not affected.
+    A class rather than a generator based context manager, it runs on every request.
+    """
+
+    __slots__ = ("outcome", "rows", "phases", "start", "recording")
+
+    def __init__(self, record=True):
+        self.outcome = "ok"
+        self.rows = None
+        self.phases = []
+        self.recording = METRICS_ENABLED and record
+
+    def phase(self, name):
+        return Phase(name, self.phases)
+
+    def __enter__(self):
+        if self.recording:
+            IN_FLIGHT.inc()
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.recording:
+            return
+        REQUEST_SECONDS.observe(time.perf_counter() - self.start)
+        IN_FLIGHT.dec()
+        if exc_type is not None:
+            self.outcome = "error"
+        for name, seconds in self.phases:
+            PHASE_SECONDS[name].observe(seconds)
+        if self.rows is not None:
+            REQUEST_ROWS.observe(self.rows)
+        OUTCOME_REQUESTS[self.outcome].inc()
+
+
+def track_request(record=True):
+    """Return the context manager recording one /predict request (see RequestTimer)."""
+    return RequestTimer(record)
+
+
+def track_stream(stream, record=True):
+    """
+    Yield the chunks of a streamed response, recorded as one request like track_request().
+    stream(timer) returns the chunk iterator; the request stays in flight until the last
+    chunk is sent, not only until the view function returns.
+    """
+    with track_request(record) as timer:
+        yield from stream(timer)
+
+
+# (version, load seconds) of the served model, recorded again in forked workers
+served_model = None
+
+
+def record_model(version, load_seconds, previous_version=None):
+    """Record the model version now served by this process and how long it took to load."""
+    global served_model
+    served_model = (version, load_seconds)
+    if not METRICS_ENABLED:
+        return
+    if previous_version is not None and previous_version != version:
+        MODEL_INFO.labels(version=str(previous_version)).set(0)
+    MODEL_INFO.labels(version=str(version)).set(1)
+    MODEL_LOAD_SECONDS.set(load_seconds)
+
+
+def record_cache(hits, misses, duplicates):
+    """Record the prediction cache lookups of one request."""
+    if not METRICS_ENABLED:
+        return
+    CACHE_HITS.inc(hits)
+    CACHE_MISSES.inc(misses)
+    CACHE_DUPLICATES.inc(duplicates)
+
+
+def record_warmup(seconds):
+    """Record how long this worker's warm-up took."""
+    if METRICS_ENABLED:
+        WARMUP_SECONDS.set(seconds)
+
+
+def metrics_response():
+    """Return (body, content type) of the metrics of all worker processes."""
+    if not METRICS_ENABLED:
+        return b"# metrics disabled (PREDICT_METRICS=0 or prometheus_client not installed)\n", "text/plain"
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def worker_started():
+    """
+    Record the model loaded by the gunicorn master (--preload) as served by this forked
+    worker, and drop the master's model gauges, it serves no requests (post_fork hook).
+    """
+    if METRICS_ENABLED:
+        multiprocess.mark_process_dead(os.getppid())
+        if served_model is not None:
+            record_model(*served_model)
+
+
+def mark_process_dead(pid):
+    """Drop the live gauges of an exited worker (gunicorn child_exit hook)."""
+    if METRICS_ENABLED:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,191 @@
+"""
+Warm-up and readiness of the predict workers.
+
+The first requests a fresh worker handles are slow: lazy imports, the first calls into
+pandas, sklearn and the MLflow pyfunc wrapper, and Flask's and the JSON encoder's
+first-call setup. Before a gunicorn worker accepts connections, gunicorn.conf.py
+(post_worker_init) sends it WARMUP_REQUESTS synthetic requests of every size in
+WARMUP_BATCH_SIZES through its own /predict, with random rows of the model's input
+columns. A new or recycled worker therefore never serves a cold request. The warm-up
+requests carry WARMUP_KEY in their WSGI environ (ASGI scope), which clients cannot set:
+the apps check it with is_warmup() per request, leave them out of the request metrics
+and bypass the prediction cache, whatever else the worker is handling at the time.
+
+    GET /healthz  200 while the process runs (liveness)
+    GET /ready    200 once the worker is warmed up, 503 before or if the warm-up failed
+                  (readiness), with the warm-up state and duration
+
+The ASGI app warms up in its lifespan startup, before uvicorn accepts connections.
+Outside gunicorn (flask run, the in-process benchmarks) the first GET /ready runs the
+warm-up. The duration is also exported as predict_warmup_seconds (serving_metrics.py).
+
+Configuration:
+    WARMUP_REQUESTS     warm-up requests per batch size (default 5, 0: no warm-up)
+    WARMUP_BATCH_SIZES  comma-separated rows per warm-up request (default 1,100)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+import serving_metrics
+from payload import FEATURE_COLUMNS, JSON_MIMETYPE
+
+WARMUP_REQUESTS = int(os.getenv("WARMUP_REQUESTS", "5"))
+WARMUP_BATCH_SIZES = [int(size) for size in os.getenv("WARMUP_BATCH_SIZES", "1,100").split(",") if size.strip()]
+
+# WSGI environ / ASGI scope key marking a synthetic warm-up request
+WARMUP_KEY = "predict.warmup"
+
+
+def is_warmup(environ):
+    """True if the WSGI environ or ASGI scope is that of a warm-up request."""
+    return bool(environ.get(WARMUP_KEY))
+
+
+def signature_columns(model, default=FEATURE_COLUMNS):
+    """Return the input column names of the model's MLflow signature, default if it has none."""
+    try:
+        names = model.metadata.get_input_schema().input_names()
+    except Exception:
+        return list(default)
+    # The request arrays are taken by position, only a signature of the same width fits
+    return list(names) if len(names) == len(default) else list(default)
+
+
+def synthetic_body(columns, rows, seed=0):
+    """JSON body of rows random feature records with the spread of the customer data."""
+    values = np.random.default_rng(seed).normal(size=(rows, len(columns))) * 5
+    return json.dumps([dict(zip(columns, row)) for row in values.tolist()]).encode()
+
+
+class Warmup:
+    """Warm-up state of one worker process: cold, warming, ready or failed."""
+
+    def __init__(self, columns=FEATURE_COLUMNS, requests=WARMUP_REQUESTS, batch_sizes=WARMUP_BATCH_SIZES):
+        self.columns = list(columns)
+        self.requests = requests
+        self.batch_sizes = batch_sizes
+        self.state = "cold"
+        self.seconds = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def bodies(self):
+        """The warm-up request bodies, in the order they are sent."""
+        return [synthetic_body(self.columns, rows, seed)
+                for rows in self.batch_sizes for seed in range(self.requests)]
+
+    def run(self, send):
+        """
+        Send the warm-up requests with send(body, content_type) -> HTTP status, once per
+        process. Returns True if the worker is ready.
+        """
+        with self._lock:
+            if self.state != "cold":
+                return self.ready
+            start = self._begin()
+            try:
+                self._check([send(body, JSON_MIMETYPE) for body in self.bodies()])
+            except Exception as e:
+                self.error = f"warm-up failed: {e}"
+            finally:
+                self._finish(start)
+            return self.ready
+
+    async def run_async(self, send):
+        """run() for the ASGI app, with await send(body, content_type) -> HTTP status."""
+        if self.state != "cold":
+            return self.ready
+        start = self._begin()
+        try:
+            self._check([await send(body, JSON_MIMETYPE) for body in self.bodies()])
+        except Exception as e:
+            self.error = f"warm-up failed: {e}"
+        finally:
+            self._finish(start)
+        return self.ready
+
+    def _begin(self):
+        self.state = "warming"
+        return time.perf_counter()
+
+    def _check(self, statuses):
+        failed = sum(status != 200 for status in statuses)
+        self.error = f"{failed} of {len(statuses)} warm-up requests failed" if failed else None
+
+    def _finish(self, start):
+        self.seconds = time.perf_counter() - start
+        self.state = "failed" if self.error else "ready"
+        serving_metrics.record_warmup(self.seconds)
+        if self.error:
+            logging.error(f"Worker {os.getpid()}: {self.error}, not ready")
+        else:
+            logging.info(f"Worker {os.getpid()} warmed up with {self.requests * len(self.batch_sizes)} "
+                         f"requests in {self.seconds:.3f}s")
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "warmup_state": self.state,
+            "warmup_seconds": round(self.seconds, 4) if self.seconds is not None else None,
+            "warmup_requests": self.requests * len(self.batch_sizes),
+            "error": self.error,
+            "pid": os.getpid(),
+        }
+
+
+def flask_sender(app, path="/predict"):
+    """Return send(body, content_type) -> status posting to path of the Flask app, without a server."""
+    client = app.test_client()
+
+    def send(body, content_type):
+        return client.post(path, data=body, content_type=content_type,
+                           environ_base={WARMUP_KEY: True}).status_code
+    return send
+
+
+def asgi_sender(app, path="/predict"):
+    """Return async send(body, content_type) -> status posting to path of the ASGI app, without a server."""
+    async def send(body, content_type):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+            "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 0), WARMUP_KEY: True,
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        statuses = []
+
+        async def receive():
+            return messages.pop() if messages else {"type": "http.disconnect"}
+
+        async def send_message(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        await app(scope, receive, send_message)
+        return statuses[0]
+    return send
+
+
+def install(app, columns=FEATURE_COLUMNS):
+    """Attach a Warmup to the Flask app, found by warm_up_worker(), and return it."""
+    warmup = Warmup(columns)
+    app.extensions["warmup"] = warmup
+    return warmup
+
+
+def warm_up_worker(app):
+    """Warm up a gunicorn worker's app before it accepts connections (post_worker_init hook)."""
+    warmup = getattr(app, "extensions", {}).get("warmup")
+    if warmup is not None:
+        warmup.run(flask_sender(app))